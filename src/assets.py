@@ -0,0 +1,193 @@
+import os
+import struct
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+from typing import Callable
+
+import pygame
+
+from settings import TRANSFORM_CACHE_SIZE
+
+# bundle layout (little endian)
+# header: magic, version, entry count
+# entry:  path length, path, source mtime (ns), source size, width, height, alpha flag, RGB or RGBA pixels
+BUNDLE_MAGIC = b'PMAB'
+BUNDLE_VERSION = 1
+BUNDLE_HEADER = struct.Struct('<4sHI')
+ENTRY_PATH = struct.Struct('<H')
+ENTRY_INFO = struct.Struct('<qqIIB')
+
+
+class AssetRegistry:
+    def __init__(self) -> None:
+        # decoded images, shared by everyone asking for the same file
+        self.images: dict[str, pygame.Surface] = {}
+        self.converted: dict[str, pygame.Surface] = {}
+        # bundle: path -> (mtime, size, width, height, pixel format, pixels)
+        self.bundle_path = None
+        self.bundle = {}
+        self.bundle_changed = False
+
+    def key(self, path) -> str:
+        return os.path.normpath(path)
+
+    def image(self, path, convert = True) -> pygame.Surface:
+        key = self.key(path)
+        if convert:
+            if key not in self.converted:
+                self.converted[key] = self.decode(key).convert_alpha()
+            return self.converted[key]
+        return self.decode(key)
+
+    def decode(self, key) -> pygame.Surface:
+        if key not in self.images:
+            if self.bundled(key):
+                width, height, pixel_format, pixels = self.bundle[key][2:]
+                surf = pygame.image.frombytes(bytes(pixels), (width, height), pixel_format)
+                self.images[key] = surf
+            else:
+                self.add_decoded(*self.read_and_decode(key))
+        return self.images[key]
+
+    def bundled(self, key) -> bool:
+        entry = self.bundle.get(key)
+        if not entry:
+            return False
+        stat = os.stat(key)
+        return entry[:2] == (stat.st_mtime_ns, stat.st_size)
+
+    def read_and_decode(self, key) -> tuple:
+        # safe to run off the main thread, it does not touch the display
+        stat = os.stat(key)
+        with open(key, 'rb') as file:
+            data = file.read()
+        surf = pygame.image.load(BytesIO(data), key)
+        entry = None
+        if self.bundle_path:
+            # images without transparency stay opaque surfaces
+            pixel_format = 'RGBA' if surf.get_flags() & pygame.SRCALPHA or surf.get_colorkey() else 'RGB'
+            pixels = pygame.image.tobytes(surf, pixel_format)
+            entry = (stat.st_mtime_ns, stat.st_size, *surf.get_size(), pixel_format, pixels)
+        return key, surf, entry
+
+    def add_decoded(self, key, surf, entry) -> None:
+        self.images[key] = surf
+        if entry:
+            self.bundle[key] = entry
+            self.bundle_changed = True
+
+    def preload(self, paths, progress: Callable[[int, int], None] = None, workers = None) -> None:
+        keys = list(dict.fromkeys(self.key(path) for path in paths))
+        total = len(keys)
+        done = 0
+        # bundled images are cheap, only the rest is worth a thread
+        missing = []
+        for key in keys:
+            if key in self.images or self.bundled(key):
+                done += 1
+            else:
+                missing.append(key)
+        if progress:
+            progress(done, total)
+
+        workers = workers or min(8, os.cpu_count() or 1)
+        with ThreadPoolExecutor(max_workers = workers) as executor:
+            for future in as_completed([executor.submit(self.read_and_decode, key) for key in missing]):
+                self.add_decoded(*future.result())
+                done += 1
+                if progress:
+                    progress(done, total)
+        # converting needs the display, so it stays on the main thread
+        for key in keys:
+            self.image(key)
+
+    # bundle
+    def open_bundle(self, path) -> None:
+        self.bundle_path = path
+        self.bundle = {}
+        self.bundle_changed = False
+        if not os.path.exists(path):
+            return
+        with open(path, 'rb') as file:
+            data = memoryview(file.read())
+        magic, version, count = BUNDLE_HEADER.unpack_from(data, 0)
+        # an outdated bundle is simply rebuilt
+        if magic != BUNDLE_MAGIC or version != BUNDLE_VERSION:
+            return
+        offset = BUNDLE_HEADER.size
+        for _ in range(count):
+            length, = ENTRY_PATH.unpack_from(data, offset)
+            offset += ENTRY_PATH.size
+            key = bytes(data[offset:offset + length]).decode()
+            offset += length
+            mtime, size, width, height, alpha = ENTRY_INFO.unpack_from(data, offset)
+            offset += ENTRY_INFO.size
+            pixel_format = 'RGBA' if alpha else 'RGB'
+            length = width * height * len(pixel_format)
+            self.bundle[key] = (mtime, size, width, height, pixel_format, data[offset:offset + length])
+            offset += length
+
+    def save_bundle(self) -> None:
+        if self.bundle_path and self.bundle_changed:
+            self.write_bundle()
+        self.close_bundle()
+
+    def write_bundle(self) -> None:
+        # only keep what was used this run, stale entries drop out
+        entries = {key: self.bundle[key] for key in self.images if key in self.bundle}
+        data = [BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(entries))]
+        for key, (mtime, size, width, height, pixel_format, pixels) in entries.items():
+            encoded_key = key.encode()
+            info = ENTRY_INFO.pack(mtime, size, width, height, pixel_format == 'RGBA')
+            data += [ENTRY_PATH.pack(len(encoded_key)), encoded_key, info, pixels]
+        directory = os.path.dirname(self.bundle_path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        with open(self.bundle_path, 'wb') as file:
+            file.write(b''.join(data))
+
+    def close_bundle(self) -> None:
+        # the bundle pixels point into the whole file, and a converted surface makes its decoded one a second copy
+        # images asked for later are decoded from their file again
+        self.bundle_path = None
+        self.bundle = {}
+        self.bundle_changed = False
+        for key in self.converted:
+            self.images.pop(key, None)
+
+
+class TransformCache:
+    def __init__(self, size) -> None:
+        self.size = size
+        # (source surface, transform, arguments) -> derived surface, least recently used first
+        self.surfaces: OrderedDict[tuple, pygame.Surface] = OrderedDict()
+
+    def get(self, surf, transform, *args) -> pygame.Surface:
+        key = (surf, transform, args)
+        if key in self.surfaces:
+            self.surfaces.move_to_end(key)
+            return self.surfaces[key]
+        match transform:
+            case 'flip': derived = pygame.transform.flip(surf, *args)
+            case 'scale2x': derived = pygame.transform.scale2x(surf)
+            case 'alpha':
+                derived = surf.copy()
+                derived.set_alpha(*args)
+        self.surfaces[key] = derived
+        while len(self.surfaces) > self.size:
+            self.surfaces.popitem(last = False)
+        return derived
+
+    def flip(self, surf, flip_x, flip_y) -> pygame.Surface:
+        return self.get(surf, 'flip', flip_x, flip_y)
+
+    def scale2x(self, surf) -> pygame.Surface:
+        return self.get(surf, 'scale2x')
+
+    def alpha(self, surf, alpha) -> pygame.Surface:
+        return self.get(surf, 'alpha', alpha)
+
+
+assets = AssetRegistry()
+transforms = TransformCache(TRANSFORM_CACHE_SIZE)
@@ -0,0 +1,78 @@
+import argparse
+import os
+import platform
+import sys
+
+# headless, before pygame is imported anywhere
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from bench.canvas import fill_canvas
+from bench.cases import editor_cases, level_cases
+from bench.runner import compare, load_results, measure, save_results
+from main import Main
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog = 'python -m bench', description = 'Headless benchmarks for the editor and level hot paths')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = [1_000, 10_000, 100_000], help = 'canvas sizes in tiles, up to 1000000')
+    parser.add_argument('--frames', type = int, default = 120, help = 'calls for the per frame cases')
+    parser.add_argument('--builds', type = int, default = 3, help = 'calls for create_grid and build_level')
+    parser.add_argument('--cases', nargs = '+', help = 'only run these cases')
+    parser.add_argument('--output', default = '../bench_results.json')
+    parser.add_argument('--baseline', default = '../bench_baseline.json')
+    parser.add_argument('--threshold', type = float, default = 0.25, help = 'allowed slowdown against the baseline, 0.25 = 25%%')
+    parser.add_argument('--save-baseline', action = 'store_true', help = 'store this run as the new baseline')
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    app = Main()
+    dt = 1 / 60
+    results = {}
+
+    for size in args.sizes:
+        fill_canvas(app.editor, size)
+        frame_cases, build_cases = editor_cases(app.editor, dt)
+        grid = app.editor.create_grid()
+        level_frame_cases, level_build_cases = level_cases(app.level_assets(), grid, dt)
+        frame_cases.update(level_frame_cases)
+        build_cases.update(level_build_cases)
+
+        for cases, calls in ((frame_cases, args.frames), (build_cases, args.builds)):
+            for name, call in cases.items():
+                if args.cases and name not in args.cases:
+                    continue
+                result = measure(call, calls, alloc_calls = min(calls, 10))
+                results[f'{name}/{size}'] = result
+                print(f"{name:>16} {size:>9} tiles  p50 {result['p50_ms']:9.3f} ms  p90 {result['p90_ms']:9.3f} ms"
+                      f"  p99 {result['p99_ms']:9.3f} ms  peak {result['peak_bytes_per_call'] / 1024:9.1f} KiB")
+
+    meta = {
+        'python': platform.python_version(),
+        'pygame': pygame.version.ver,
+        'platform': platform.platform(),
+        'frames': args.frames,
+        'builds': args.builds,
+    }
+    save_results(args.output, results, meta)
+    if args.save_baseline:
+        save_results(args.baseline, results, meta)
+        print(f'baseline saved to {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        regressions = compare(results, load_results(args.baseline), args.threshold)
+        if regressions:
+            print('regressions:')
+            for line in regressions:
+                print(f'  {line}')
+            return 1
+        print('no regressions')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
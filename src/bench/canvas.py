@@ -0,0 +1,44 @@
+from math import isqrt
+
+from pygame.math import Vector2 as vector
+
+from chunks import ChunkedTileStore
+from editor import CanvasObject, CanvasTile, Editor
+from settings import *
+from tiles import TILES
+
+
+def tile_for(col, row) -> int:
+    # a repeatable mix of everything the editor can paint, mostly terrain
+    if (col * 7 + row * 3) % 29 == 0:
+        return 7 + (col + row) % 4  # enemies
+    if (col + row) % 13 == 0:
+        return 4 + col % 3  # coins
+    if row % 5 == 0:
+        return 3  # water
+    return 2  # terrain
+
+
+def fill_canvas(editor: Editor, tile_count) -> None:
+    cols = max(1, isqrt(tile_count * 4))
+    editor.canvas_data = ChunkedTileStore()
+    for i in range(tile_count):
+        cell = (i % cols, i // cols)
+        editor.canvas_data[cell] = CanvasTile(tile_for(*cell))
+    editor.recompute_neighbours(editor.canvas_data.keys())
+
+    # palms, one for every 500 tiles
+    palm_ids = sorted(TILES.palm_ids)
+    for sprite in editor.canvas_objects:
+        if sprite.tile_id not in TILES.fixed_ids:
+            sprite.kill()
+    for i in range(tile_count // 500):
+        tile_id = palm_ids[i % len(palm_ids)]
+        groups = [editor.canvas_objects, editor.bg_objects if tile_id in TILES.palm_bg_ids else editor.fg_objects]
+        col, row = (i * 37) % cols, (i * 11) % max(1, tile_count // cols)
+        CanvasObject(
+            pos = editor.origin + vector(col, row) * TILE_SIZE,
+            frames = editor.animations[tile_id]['frames'],
+            tile_id = tile_id,
+            origin = editor.origin,
+            groups = groups)
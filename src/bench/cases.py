@@ -0,0 +1,54 @@
+from random import Random
+
+from editor import Editor
+from level import Level
+from settings import *
+
+# every case returns (per frame calls, expensive calls that run fewer times)
+
+
+def switch(grid = None) -> None:
+    pass
+
+
+def editor_cases(editor: Editor, dt) -> tuple[dict, dict]:
+    cells = list(editor.canvas_data.keys())
+    random = Random(len(cells))
+    picks = [random.choice(cells) for _ in range(1000)]
+
+    # look at the middle of the canvas
+    middle = cells[len(cells) // 2]
+    editor.origin.update(-middle[0] * TILE_SIZE + WINDOW_WIDTH / 2, -middle[1] * TILE_SIZE + WINDOW_HEIGHT / 2)
+    for sprite in editor.canvas_objects:
+        sprite.pan_pos(editor.origin)
+
+    def draw_level() -> None:
+        editor.animation_update(dt)
+        editor.draw_level()
+
+    def check_neighbours() -> None:
+        editor.check_neighbours(picks[random.randrange(len(picks))])
+
+    # water over a 100 x 100 area around the middle, added and taken away on every other call
+    fills = [False]
+
+    def fill_region() -> None:
+        fills[0] = not fills[0]
+        editor.fill_region((middle[0] - 50, middle[1] - 50), (middle[0] + 49, middle[1] + 49), 3, erase = not fills[0])
+
+    return {'draw_level': draw_level, 'check_neighbours': check_neighbours}, {'create_grid': editor.create_grid, 'fill_region': fill_region}
+
+
+def level_cases(level_assets, grid, dt) -> tuple[dict, dict]:
+    level = Level(grid, switch, level_assets)
+
+    def custom_draw() -> None:
+        level.all_sprites.custom_draw(level.player)
+
+    def player_update() -> None:
+        level.player.update(dt)
+
+    def build_level() -> None:
+        Level(grid, switch, level_assets)
+
+    return {'custom_draw': custom_draw, 'player_update': player_update}, {'build_level': build_level}
@@ -0,0 +1,83 @@
+import argparse
+import os
+import sys
+from hashlib import md5
+from time import perf_counter_ns
+
+# headless, before pygame is imported anywhere
+os.environ['SDL_VIDEODRIVER'] = 'dummy'
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+from bench.cases import switch
+from bench.runner import percentile
+from level import Level
+from main import Main
+from replay import Replay, state_checksum
+from settings import *
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog = 'python -m bench.replay', description = 'Replay a recorded level run headless and time every frame')
+    parser.add_argument('path', nargs = '?', default = REPLAY_FILE)
+    parser.add_argument('--runs', type = int, default = 3, help = 'times to play the recording')
+    parser.add_argument('--check-streaming', action = 'store_true', help = 'compare every frame with a level that builds all chunks at the start')
+    return parser.parse_args()
+
+
+def play(replay: Replay, level_assets) -> tuple[list[float], bytes]:
+    level = Level(replay.grid, switch, level_assets, input_source = replay.keys())
+    times = []
+    for dt in replay.dts:
+        start = perf_counter_ns()
+        level.run(dt)
+        times.append((perf_counter_ns() - start) / 1_000_000)
+    return times, state_checksum(level)
+
+
+def frame_hashes(replay: Replay, level_assets, stream_margin) -> list[bytes]:
+    level = Level(replay.grid, switch, level_assets, input_source = replay.keys(), stream_margin = stream_margin)
+    hashes = []
+    for dt in replay.dts:
+        level.run(dt)
+        hashes.append(md5(pygame.image.tobytes(level.display_surface, 'RGB')).digest())
+    return hashes
+
+
+def check_streaming(replay: Replay, level_assets) -> bool:
+    # sprites that leave and come back have to look the same as if they had never left
+    streamed = frame_hashes(replay, level_assets, STREAM_MARGIN)
+    built = frame_hashes(replay, level_assets, None)
+    differ = [frame for frame, (a, b) in enumerate(zip(streamed, built)) if a != b]
+    if differ:
+        print(f'streaming changes {len(differ)} of {len(streamed)} frames, the first is frame {differ[0]}')
+        return False
+    print(f'streaming leaves all {len(streamed)} frames as they are')
+    return True
+
+
+def main() -> int:
+    args = parse_args()
+    app = Main()
+    replay = Replay.load(args.path)
+    print(f'{args.path}: {len(replay)} frames, {sum(replay.dts):.1f} s')
+
+    matches = True
+    for run in range(args.runs):
+        times, checksum = play(replay, app.level_assets())
+        matches = matches and checksum == replay.checksum
+        print(f'run {run + 1}  mean {sum(times) / max(len(times), 1):7.3f} ms  p50 {percentile(times, 0.5):7.3f} ms'
+              f'  p90 {percentile(times, 0.9):7.3f} ms  p99 {percentile(times, 0.99):7.3f} ms  max {max(times):7.3f} ms'
+              f'  checksum {checksum.hex()}')
+
+    if not matches:
+        print(f'checksum differs from the recording ({replay.checksum.hex()}), the game play changed')
+        return 1
+    print('checksum matches the recording')
+    if args.check_streaming and not check_streaming(replay, app.level_assets()):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import gc
+import json
+import tracemalloc
+from time import perf_counter_ns
+from typing import Callable
+
+
+def percentile(values, fraction) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(call: Callable[[], None], calls, alloc_calls) -> dict:
+    # latency, after one warm up call that fills caches and indexes
+    call()
+    gc.collect()
+    times = []
+    for _ in range(calls):
+        start = perf_counter_ns()
+        call()
+        times.append((perf_counter_ns() - start) / 1_000_000)
+
+    # allocations, in a separate pass because tracing slows everything down
+    tracemalloc.start()
+    allocated = 0
+    peak = 0
+    for _ in range(alloc_calls):
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        call()
+        after, call_peak = tracemalloc.get_traced_memory()
+        allocated += max(0, after - before)
+        peak = max(peak, call_peak - before)
+    tracemalloc.stop()
+
+    return {
+        'calls': calls,
+        'mean_ms': sum(times) / len(times),
+        'p50_ms': percentile(times, 0.5),
+        'p90_ms': percentile(times, 0.9),
+        'p99_ms': percentile(times, 0.99),
+        'max_ms': max(times),
+        'retained_bytes_per_call': allocated // max(1, alloc_calls),
+        'peak_bytes_per_call': peak,
+    }
+
+
+def compare(results, baseline, threshold, metric = 'p50_ms') -> list[str]:
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        before = baseline[name][metric]
+        after = result[metric]
+        if before > 0 and after > before * (1 + threshold):
+            regressions.append(f'{name}: {metric} {before:.3f} -> {after:.3f} ms (+{(after / before - 1) * 100:.0f}%)')
+    return regressions
+
+
+def load_results(path) -> dict:
+    with open(path) as file:
+        return json.load(file)['results']
+
+
+def save_results(path, results, meta) -> None:
+    with open(path, 'w') as file:
+        json.dump({'meta': meta, 'results': results}, file, indent = 2)
@@ -0,0 +1,89 @@
+from collections.abc import MutableMapping
+from itertools import count
+
+from settings import CHUNK_SIZE
+
+
+class ChunkedTileStore(MutableMapping):
+    def __init__(self, chunk_size = CHUNK_SIZE) -> None:
+        self.chunk_size = chunk_size
+        # cell -> tile, keeps the insertion order of a plain dict
+        self.tiles = {}
+        # chunk -> {cell: insertion number}
+        self.chunks: dict[tuple[int, int], dict[tuple[int, int], int]] = {}
+        self.counter = count()
+
+    def chunk_of(self, cell) -> tuple[int, int]:
+        return cell[0] // self.chunk_size, cell[1] // self.chunk_size
+
+    def __getitem__(self, cell):
+        return self.tiles[cell]
+
+    def __setitem__(self, cell, tile) -> None:
+        if cell not in self.tiles:
+            self.chunks.setdefault(self.chunk_of(cell), {})[cell] = next(self.counter)
+        self.tiles[cell] = tile
+
+    def __delitem__(self, cell) -> None:
+        del self.tiles[cell]
+        chunk = self.chunk_of(cell)
+        del self.chunks[chunk][cell]
+        if not self.chunks[chunk]:
+            del self.chunks[chunk]
+
+    def insert(self, cells, tiles) -> None:
+        # many cells at once, runs of cells in the same chunk look the chunk up once
+        chunks = self.chunks
+        size = self.chunk_size
+        key = chunk = None
+        for cell in cells:
+            cell_key = (cell[0] // size, cell[1] // size)
+            if cell_key != key:
+                key = cell_key
+                chunk = chunks.setdefault(key, {})
+            if cell not in chunk:
+                chunk[cell] = next(self.counter)
+        self.tiles.update(zip(cells, tiles))
+
+    def remove(self, cells) -> None:
+        chunks = self.chunks
+        size = self.chunk_size
+        for cell in cells:
+            del self.tiles[cell]
+            key = (cell[0] // size, cell[1] // size)
+            chunk = chunks[key]
+            del chunk[cell]
+            if not chunk:
+                del chunks[key]
+
+    def __contains__(self, cell) -> bool:
+        return cell in self.tiles
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def __len__(self) -> int:
+        return len(self.tiles)
+
+    def keys(self):
+        return self.tiles.keys()
+
+    def values(self):
+        return self.tiles.values()
+
+    def items(self):
+        return self.tiles.items()
+
+    def get(self, cell, default = None):
+        return self.tiles.get(cell, default)
+
+    def visible(self, cols: range, rows: range) -> list[tuple[tuple[int, int], object]]:
+        # cells inside the col / row range, in insertion order so overlapping tiles draw the same way
+        found = []
+        for chunk_col in range(cols.start // self.chunk_size, (cols.stop - 1) // self.chunk_size + 1):
+            for chunk_row in range(rows.start // self.chunk_size, (rows.stop - 1) // self.chunk_size + 1):
+                chunk = self.chunks.get((chunk_col, chunk_row))
+                if chunk:
+                    found.extend((order, cell) for cell, order in chunk.items() if cell[0] in cols and cell[1] in rows)
+        found.sort()
+        return [(cell, self.tiles[cell]) for order, cell in found]
@@ -0,0 +1,55 @@
+from array import array
+from itertools import compress, repeat
+from operator import gt, mul, sub
+
+import pygame
+
+from assets import transforms
+
+
+class CloudParticles:
+    def __init__(self, surfaces) -> None:
+        # every cloud image at normal and double size, scaled once
+        self.pool = list(surfaces) + [transforms.scale2x(surf) for surf in surfaces]
+        self.base_count = len(surfaces)
+        # one entry per cloud, x on the screen and y above the horizon
+        self.xs = array('d')
+        self.ys = array('d')
+        self.speeds = array('d')
+        self.images = array('H')
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def spawn(self, x, y, speed, image, scaled = False) -> None:
+        self.xs.append(x)
+        self.ys.append(y)
+        self.speeds.append(speed)
+        self.images.append(image + self.base_count if scaled else image)
+
+    def cull(self, left) -> None:
+        keep = list(map(gt, self.xs, repeat(left)))
+        self.xs = array('d', compress(self.xs, keep))
+        self.ys = array('d', compress(self.ys, keep))
+        self.speeds = array('d', compress(self.speeds, keep))
+        self.images = array('H', compress(self.images, keep))
+
+    def update(self, dt) -> array:
+        # all clouds in one pass, returns where they were before
+        previous = self.xs
+        self.xs = array('d', map(sub, previous, map(mul, self.speeds, repeat(dt))))
+        return previous
+
+    def moved_rects(self, previous, horizon_y) -> list[pygame.Rect]:
+        # area covered by every cloud that moved to another pixel column
+        rects = []
+        for i, (before, after) in enumerate(zip(previous, self.xs)):
+            if int(before) != int(after):
+                surf = self.pool[self.images[i]]
+                y = int(horizon_y - self.ys[i])
+                rects.append(surf.get_rect(topleft = (int(before), y)).union(surf.get_rect(topleft = (int(after), y))))
+        return rects
+
+    def draw(self, surface, horizon_y) -> None:
+        positions = zip(self.xs, map(sub, repeat(horizon_y), self.ys))
+        surface.blits(zip(map(self.pool.__getitem__, self.images), positions), doreturn = False)
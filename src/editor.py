@@ -1,30 +1,46 @@
+import os
 import sys
 from pygame.math import Vector2 as vector
 from pygame.mouse import get_pos as mouse_pos
 from pygame.mouse import get_pressed as mouse_btns
-from pygame.image import load
 from functools import partial
 from typing import NewType
 from random import choice, randint
+from assets import assets, transforms
+from chunks import ChunkedTileStore
+from clouds import CloudParticles
+from history import History
+from level_file import load_level, save_level
 from menu import Menu
+from painting import FrameInput, Stroke
+from regions import Clipboard, flood_cells, rect_cells, region_bounds
+from profiler import profiler
 from settings import *
 from support import *
+from tiles import TILES
 from timer import Timer
 
 LevelGrid = NewType('LevelGrid', dict[dict])
+# bit of every neighbour in a terrain mask, in the order the land tiles are named
+NEIGHBOR_BITS = {name: 1 << i for i, name in enumerate(NEIGHBOR_DIRECTIONS)}
+NEIGHBOR_SIDES = [(bit, NEIGHBOR_DIRECTIONS[name]) for name, bit in NEIGHBOR_BITS.items()]
+INPUT_EVENTS = {pygame.KEYDOWN, pygame.KEYUP, pygame.MOUSEMOTION, pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP, pygame.MOUSEWHEEL}
 
 class Editor:
     def __init__(self, land_tiles, switch) -> None:
         # main setup
         self.display_surface = pygame.display.get_surface()
-        self.canvas_data: dict[CanvasTile] = {}
+        self.canvas_data: ChunkedTileStore[CanvasTile] = ChunkedTileStore()
+        # chunks with terrain masks that are out of date
+        self.stale_chunks: set[tuple[int, int]] = set()
         self.switch = switch
         # imports
         self.land_tiles = land_tiles
+        self.terrain_names, self.terrain_surfs = self.terrain_table()
         self.imports()
         # clouds
-        self.current_clouds = []
         self.cloud_surf = import_folder('../graphics/clouds')
+        self.clouds = CloudParticles(self.cloud_surf)
         self.cloud_timer = pygame.USEREVENT + 1
         pygame.time.set_timer(self.cloud_timer, 2000) 
         # navigation
@@ -35,10 +51,22 @@ class Editor:
         self.support_line_surf = pygame.Surface((WINDOW_WIDTH, WINDOW_HEIGHT))
         self.support_line_surf.set_colorkey("green")
         self.support_line_surf.set_alpha(30)
+        self.support_line_offset = None
         # selection
         self.selection_index = 2
-        self.last_selected_cell = None
         self.menu = Menu()
+        # painting, the mouse is read once a frame
+        self.mouse = self.read_input([])
+        self.stroke: Stroke | None = None
+        # undo
+        self.history = History()
+        self.drag_starts: dict[CanvasObject, vector] = {}
+        # regions, shift drags fill or erase, ctrl drags copy
+        self.region_start = None
+        self.region_mode = None
+        # set when a region is done, its click does not paint as well
+        self.region_done = False
+        self.clipboard = Clipboard({}, [])
         # objects
         self.canvas_objects = pygame.sprite.Group()
         self.fg_objects = pygame.sprite.Group()
@@ -46,6 +74,18 @@ class Editor:
         self.object_drag_active = False
         self.object_timer = Timer(400)
         self.switch_timer = Timer(500)
+        # idle
+        self.last_input = pygame.time.get_ticks()
+        # dirty rects
+        self.dirty_rects_enabled = EDITOR_DIRTY_RECTS
+        self.dirty_rects: list[pygame.Rect] = []
+        self.marked_rects: list[pygame.Rect] = []
+        self.redraw_all = True
+        self.changed_animations = set()
+        self.object_states = {}
+        self.last_preview = (None, None)
+        self.drawn_view = None
+        self.drawn_selection_index = None
         
         # player
         CanvasObject(
@@ -58,7 +98,7 @@ class Editor:
         # sky
         self.sky_handle = CanvasObject(
             pos = (WINDOW_WIDTH/2, WINDOW_HEIGHT/2),
-            frames = [self.sky_handle_surface],
+            frames = Frames([self.sky_handle_surface]),
             tile_id = 1,
             origin = self.origin,
             groups = [self.canvas_objects, self.bg_objects]
@@ -67,7 +107,7 @@ class Editor:
 
     # Support
     def get_current_cell(self, obj = None) -> tuple[int, int]:
-        current_pos = vector(mouse_pos()) if not obj else vector(obj.distance_to_origin)
+        current_pos = vector(self.mouse.pos) if not obj else vector(obj.distance_to_origin)
         distance_to_origin = current_pos - self.origin
         if distance_to_origin.x > 0:
             col = int(distance_to_origin.x / TILE_SIZE)
@@ -79,68 +119,118 @@ class Editor:
             row = int(distance_to_origin.y / TILE_SIZE) - 1
         return col, row
 
+    def place_tile(self, cell_pos, tile_id) -> None:
+        if cell_pos in self.canvas_data:
+            self.canvas_data[cell_pos].add_id(tile_id)
+        else:
+            self.canvas_data[cell_pos] = CanvasTile(tile_id)
+
+    def terrain_table(self) -> tuple[list[str], list[pygame.Surface]]:
+        # land tile name and surface for all 256 neighbour masks, 'X' where there is no tile
+        names = []
+        for mask in range(256):
+            name = ''.join(letter for letter, bit in NEIGHBOR_BITS.items() if mask & bit)
+            names.append(name if name in self.land_tiles else 'X')
+        return names, [self.land_tiles[name] for name in names]
+
     def check_neighbours(self,cell_pos) -> None:
-        # create a local cluster
-        cluster_size = 3
-        local_cluster = [
-            (col + cell_pos[0] - int(cluster_size/2), row + cell_pos[1]- int(cluster_size/2)) 
-            for col in range(cluster_size) 
-            for row in range(cluster_size)]
-        # check neighbours
-        for cell in local_cluster:
-            if cell in self.canvas_data:
-                self.canvas_data[cell].terrain_neighbours = []
-                self.canvas_data[cell].water_on_top = False
-                for name, side in NEIGHBOR_DIRECTIONS.items():
-                    neighbour_cell = (cell[0] + side[0], cell[1]+ side[1])      
-                    if neighbour_cell in self.canvas_data:
-                        # water top neighbour
-                        if self.canvas_data[neighbour_cell].has_water \
-                            and self.canvas_data[cell].has_water and name == 'A': 
-                            self.canvas_data[cell].water_on_top = True
-
-                        # terrain neighbours 
-                        if self.canvas_data[neighbour_cell].has_terrain:
-                            self.canvas_data[cell].terrain_neighbours.append(name)
-                        
+        self.recompute_neighbours([cell_pos])
+        self.refresh_chunks(list(self.stale_chunks))
+
+    def recompute_neighbours(self, cells) -> None:
+        # the chunks are only marked here and refreshed once they are drawn or saved
+        size = self.canvas_data.chunk_size
+        self.stale_chunks.update({(col // size, row // size) for col, row in cells})
+
+    def refresh_chunks(self, chunks) -> None:
+        # terrain masks and water tops in the chunks, and in the cells around them that see a change at the edge
+        get = self.canvas_data.tiles.get
+        terrain_surfs = self.terrain_surfs
+        size = self.canvas_data.chunk_size
+        for chunk_col, chunk_row in chunks:
+            self.stale_chunks.discard((chunk_col, chunk_row))
+            for row in range(chunk_row * size - 1, chunk_row * size + size + 1):
+                for col in range(chunk_col * size - 1, chunk_col * size + size + 1):
+                    tile = get((col, row))
+                    if tile is None:
+                        continue
+                    mask = 0
+                    for bit, (x, y) in NEIGHBOR_SIDES:
+                        neighbour = get((col + x, row + y))
+                        if neighbour is not None and neighbour.has_terrain:
+                            mask |= bit
+                    if mask != tile.terrain_mask or tile.terrain_surf is None:
+                        tile.terrain_mask = mask
+                        tile.terrain_surf = terrain_surfs[mask]
+                    above = get((col, row - 1))
+                    tile.water_on_top = tile.has_water and above is not None and above.has_water
+
     def imports(self) -> None:
-        self.water_bottom = load('../graphics/terrain/water/water_bottom.png').convert_alpha()
-        self.sky_handle_surface = load('../graphics/cursors/handle.png').convert_alpha()
+        self.water_bottom = assets.image('../graphics/terrain/water/water_bottom.png')
+        self.sky_handle_surface = assets.image('../graphics/cursors/handle.png')
         # animations
         self.animations = {}
         for key,value in EDITOR_DATA.items():
             if value['graphics']:
-                graphics = import_folder(value['graphics'])
+                graphics = import_frames(value['graphics'])
+                width, height = graphics.size
+                # where the frames sit inside their cell, coins are centered and enemies stand on the bottom
+                match value['style']:
+                    case 'coin': offset = vector(TILE_SIZE // 2 - width // 2, TILE_SIZE // 2 - height // 2)
+                    case 'enemy': offset = vector(TILE_SIZE // 2 - width // 2, TILE_SIZE - height)
+                    case _: offset = vector()
                 self.animations[key] = {
                     'frame_index': 0,
                     'frames': graphics,
-                    'length': len(graphics)
+                    'length': graphics.count,
+                    'offset': offset
                 }
         # preview
-        self.preview_surfs = {key:load(value['preview']) for key,value in EDITOR_DATA.items() if value['preview']}
+        self.preview_surfs = {key:assets.image(value['preview'], convert = False) for key,value in EDITOR_DATA.items() if value['preview']}
 
     def animation_update(self, dt) -> None:
-        for value in self.animations.values():
+        self.changed_animations.clear()
+        for key, value in self.animations.items():
+            previous_index = int(value['frame_index'])
             value['frame_index'] += ANIMATION_SPEED * dt
             if value['frame_index'] >= value['length']:
                 value['frame_index'] = 0
+            if int(value['frame_index']) != previous_index:
+                self.changed_animations.add(key)
+
+    def visible_cells(self, rect) -> list[tuple[tuple[int, int], 'CanvasTile']]:
+        # cells around a screen area, one extra cell on every side for the tiles that reach over
+        cols = range(int((rect.left - self.origin.x) // TILE_SIZE) - 1, int((rect.right - self.origin.x) // TILE_SIZE) + 2)
+        rows = range(int((rect.top - self.origin.y) // TILE_SIZE) - 1, int((rect.bottom - self.origin.y) // TILE_SIZE) + 2)
+        if self.stale_chunks:
+            size = self.canvas_data.chunk_size
+            # a stale chunk right next to the cells changes the cell at its edge as well
+            chunk_cols = range((cols.start - 1) // size, cols.stop // size + 1)
+            chunk_rows = range((rows.start - 1) // size, rows.stop // size + 1)
+            self.refresh_chunks([chunk for chunk in self.stale_chunks if chunk[0] in chunk_cols and chunk[1] in chunk_rows])
+        return self.canvas_data.visible(cols, rows)
+
+    def cell_rect(self, cell_pos, margin = 0) -> pygame.Rect:
+        pos = self.origin + vector(cell_pos) * TILE_SIZE
+        return pygame.Rect(pos, (TILE_SIZE, TILE_SIZE)).inflate(margin * 2, margin * 2)
     
     def mouse_on_object(self) -> 'CanvasObject':
         for sprite in self.canvas_objects:
-            if sprite.rect.collidepoint(mouse_pos()):
+            if sprite.rect.collidepoint(self.mouse.pos):
                 return sprite
     
     def create_grid(self) -> LevelGrid:
-        # add objects to tiles
-        for tile in self.canvas_data.values():
-            tile.objects = []
+        self.refresh_chunks(list(self.stale_chunks))
+        # objects by the cell they are in, cells with tiles keep the order of the canvas
+        objects: dict[tuple[int, int], list[tuple[int, vector]]] = {}
         for obj in self.canvas_objects:
             current_cell = self.get_current_cell(obj)
             offset = obj.distance_to_origin - (vector(current_cell) * TILE_SIZE) 
-            if current_cell in self.canvas_data:
-                self.canvas_data[current_cell].add_id(obj.tile_id, offset)
-            else:
-                self.canvas_data[current_cell] = CanvasTile(obj.tile_id, offset)
+            cell_objects = objects.setdefault(current_cell, [])
+            if (obj.tile_id, offset) not in cell_objects:
+                cell_objects.append((obj.tile_id, offset))
+        cells = list(self.canvas_data.keys())
+        cells += [cell for cell in objects if cell not in self.canvas_data]
         
         # create empty grid
         layers = LevelGrid({
@@ -154,38 +244,101 @@ class Editor:
         
 
         # grid offset
-        left = sorted(self.canvas_data.keys(), key= lambda tile: tile[0])[0][0] # [first value][x pos]
-        top  = sorted(self.canvas_data.keys(), key= lambda tile: tile[1])[0][1] # [first value][y pos]
+        left = min(cell[0] for cell in cells)
+        top  = min(cell[1] for cell in cells)
         
         # fill the grid
         tile:CanvasTile
-        for tile_pos, tile in self.canvas_data.items():
+        for tile_pos in cells:
             col_adjusted = tile_pos[0] - left
             row_adjusted = tile_pos[1] - top
             x = col_adjusted * TILE_SIZE
             y = row_adjusted * TILE_SIZE
 
+            if tile_pos in objects:
+                for obj, offset in objects[tile_pos]:
+                    if obj in TILES.palm_bg_ids:
+                        layers['bg palms'][(int(x + offset.x), int(y + offset.y))] = obj
+                    else:
+                        layers['fg objects'][(int(x + offset.x), int(y + offset.y))] = obj
+            tile = self.canvas_data.get(tile_pos)
+            if tile is None:
+                continue
             if tile.has_water:
                 layers['water'][(x,y)] = tile.get_water()
             if tile.has_terrain:
-                layers['terrain'][(x,y)] = tile.get_terrain() if tile.get_terrain() in self.land_tiles else 'X'
+                layers['terrain'][(x,y)] = self.terrain_names[tile.terrain_mask]
             if tile.coin:
                 layers['coins'][(x + TILE_SIZE/2, y + TILE_SIZE/2)] = tile.coin
             if tile.enemy:
                 layers['enemies'][(x,y)] = tile.enemy
-            if tile.objects:
-                for obj, offset in tile.objects:
-                    if obj in [key for key,value in EDITOR_DATA.items() if value['style']=='palm_bg']:
-                        layers['bg palms'][(int(x + offset.x), int(y + offset.y))] = obj
-                    else:
-                        layers['fg objects'][(int(x + offset.x), int(y + offset.y))] = obj
 
         return layers
 
 
+    def load_grid(self, grid) -> None:
+        # turn a level grid back into canvas tiles and objects
+        self.canvas_data = ChunkedTileStore()
+        self.origin = vector()
+        objects = {sprite.tile_id: sprite for sprite in self.canvas_objects if sprite.tile_id in TILES.fixed_ids}
+        for sprite in self.canvas_objects:
+            if sprite.tile_id not in TILES.fixed_ids:
+                sprite.kill()
+
+        for layer_name, layer in grid.items():
+            for (x, y), data in layer.items():
+                match layer_name:
+                    case 'terrain': self.place_tile((int(x // TILE_SIZE), int(y // TILE_SIZE)), 2)
+                    case 'water': self.place_tile((int(x // TILE_SIZE), int(y // TILE_SIZE)), 3)
+                    case 'coins': self.place_tile((int((x - TILE_SIZE / 2) // TILE_SIZE), int((y - TILE_SIZE / 2) // TILE_SIZE)), data)
+                    case 'enemies': self.place_tile((int(x // TILE_SIZE), int(y // TILE_SIZE)), data)
+                    case _:
+                        if data in objects:
+                            sprite = objects[data]
+                        else:
+                            groups = [self.canvas_objects, self.bg_objects if data in TILES.palm_bg_ids else self.fg_objects]
+                            sprite = CanvasObject(
+                                pos = (0, 0),
+                                frames = self.animations[data]['frames'],
+                                tile_id = data,
+                                origin = self.origin,
+                                groups = groups)
+                        sprite.distance_to_origin = vector(x, y)
+        for sprite in self.canvas_objects:
+            sprite.pan_pos(self.origin)
+        self.stale_chunks = set(self.canvas_data.chunks)
+        self.history.clear()
+        self.redraw_all = True
+
+    def save_level(self, path = LEVEL_FILE) -> None:
+        save_level(path, self.create_grid())
+
+    def load_level(self, path = LEVEL_FILE) -> None:
+        self.load_grid(load_level(path))
+
     # input
-    def event_loop(self) -> None:
-        for event in pygame.event.get():
+    def idle(self) -> bool:
+        return pygame.time.get_ticks() - self.last_input > IDLE_DELAY
+
+    def read_input(self, events) -> FrameInput:
+        # a click that was released within the frame still paints its cell
+        clicked = [False, False, False]
+        for event in events:
+            if event.type == pygame.MOUSEBUTTONDOWN and 1 <= event.button <= 3:
+                clicked[event.button - 1] = True
+        held = mouse_btns()
+        return FrameInput(mouse_pos(), tuple(held[i] or clicked[i] for i in range(3)))
+
+    def event_loop(self, pending = ()) -> None:
+        # pending events were already taken off the queue while waiting for input
+        events = list(pending) + pygame.event.get()
+        self.mouse = self.read_input(events)
+        self.region_done = False
+        input_events = False
+        for event in events:
+            if event.type in INPUT_EVENTS:
+                self.last_input = pygame.time.get_ticks()
+                input_events = True
             if event.type == pygame.QUIT:
                 pygame.quit()
                 sys.exit()
@@ -194,23 +347,33 @@ class Editor:
                     self.switch_timer.activate()
                     self.switch(self.create_grid())
             
+            self.file_hotkeys(event)
+            self.history_hotkeys(event)
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
             self.pan_input(event)
             self.selection_hotkeys(event)
             self.menu_click(event)
 
+            self.region_input(event)
             self.object_drag(event)
 
+            self.create_clouds(event)
+
+        # painting only follows the mouse, once per frame for all of its events
+        if input_events and not self.region_mode and not self.region_done:
             self.canvas_add()
             self.canvas_remove()
-
-            self.create_clouds(event)
+        # a stroke ends with its button or when the mouse goes over the menu
+        if not any(self.mouse.buttons) or self.menu.rect.collidepoint(self.mouse.pos):
+            self.end_stroke()
 
     def pan_input(self, event) -> None:
         # middle mouse button pressed /released
-        if event.type == pygame.MOUSEBUTTONDOWN and mouse_btns()[1]:
+        if event.type == pygame.MOUSEBUTTONDOWN and self.mouse.buttons[1]:
             self.pan_active = True
-            self.pan_offset = vector(mouse_pos()) - self.origin
-        if not mouse_btns()[1]:
+            self.pan_offset = vector(self.mouse.pos) - self.origin
+        if not self.mouse.buttons[1]:
             self.pan_active = False
         # mousewheel
         if event.type == pygame.MOUSEWHEEL:
@@ -221,77 +384,284 @@ class Editor:
                 self.origin.x -= event.y * 50
         # panning update
         if self.pan_active:
-            self.origin = vector(mouse_pos()) - self.pan_offset
+            self.origin = vector(self.mouse.pos) - self.pan_offset
             for sprite in self.canvas_objects:
                 sprite.pan_pos(self.origin)
 
+    def file_hotkeys(self, event) -> None:
+        if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+            if event.key == pygame.K_s:
+                self.save_level()
+            if event.key == pygame.K_o and os.path.exists(LEVEL_FILE):
+                self.load_level()
+
+    def history_hotkeys(self, event) -> None:
+        if event.type == pygame.KEYDOWN and event.mod & pygame.KMOD_CTRL:
+            if event.key == pygame.K_z and not event.mod & pygame.KMOD_SHIFT:
+                self.undo()
+            if event.key == pygame.K_y or (event.key == pygame.K_z and event.mod & pygame.KMOD_SHIFT):
+                self.redo()
+
     def selection_hotkeys(self, event) -> None:
         if event.type == pygame.KEYDOWN:
             if event.key == pygame.K_RIGHT:
                 self.selection_index += 1
             if event.key == pygame.K_LEFT:
                 self.selection_index -= 1
-        self.selection_index = max(min(self.selection_index, 18), 2)
+        self.selection_index = max(min(self.selection_index, TILES.menu_ids[-1]), TILES.menu_ids[0])
 
     def menu_click(self, event) -> None:
-        if event.type == pygame.MOUSEBUTTONDOWN and self.menu.rect.collidepoint(
-            (mouse_pos())
-        ):
-            self.selection_index = self.menu.click(mouse_pos(), mouse_btns())
+        if event.type == pygame.MOUSEBUTTONDOWN and self.menu.rect.collidepoint(self.mouse.pos):
+            self.selection_index = self.menu.click(self.mouse.pos, self.mouse.buttons)
+            self.mark_dirty(self.menu.rect.inflate(10, 10))
+
+    def paint(self, erase) -> None:
+        # continue the stroke of the held button, or start a new one
+        if self.stroke is None or self.stroke.erase != erase or self.stroke.tile_id != self.selection_index:
+            self.end_stroke()
+            self.stroke = Stroke(self.selection_index, erase)
+            self.history.begin(('paint', self.selection_index, erase))
+        cells = self.stroke.extend(self.get_current_cell())
+        if cells:
+            self.apply_cells(cells, self.selection_index, erase)
+
+    def apply_cells(self, cells, tile_id, erase = False) -> None:
+        # one id added to or taken off every cell, only the slot of the id is set on the tiles already there
+        name, value = CanvasTile.slot(tile_id, erase)
+        # the same change on packed states, for the history
+        keep = CanvasTile.state_without(~0, tile_id)
+        put = 0 if erase else CanvasTile.state_with(0, tile_id)
+        get = self.canvas_data.tiles.get
+        changed, before, new, removed = [], [], [], []
+        for cell in cells:
+            tile = get(cell)
+            if tile is None:
+                if not erase:
+                    new.append(cell)
+            elif getattr(tile, name) != value:
+                state = tile.pack()
+                if state & keep | put:
+                    setattr(tile, name, value)
+                else:
+                    removed.append(cell)
+                changed.append(cell)
+                before.append(state)
+        # new and emptied cells go in and out of the canvas together
+        self.canvas_data.insert(new, CanvasTile.unpack_all([put] * len(new)))
+        self.canvas_data.remove(removed)
+        changed += new
+        before += [0] * len(new)
+        self.cells_changed(changed, before, [state & keep | put for state in before])
+
+    def apply_states(self, cells, states) -> None:
+        # packed tile states by cell, 0 clears the cell
+        # tiles are changed in place, then one neighbour pass and one dirty rect for the lot
+        get = self.canvas_data.tiles.get
+        changed, before, after = [], [], []
+        new, new_states, removed = [], [], []
+        for cell, state in zip(cells, states):
+            tile = get(cell)
+            old_state = tile.pack() if tile else 0
+            if state == old_state:
+                continue
+            if tile is None:
+                new.append(cell)
+                new_states.append(state)
+            elif state:
+                tile.load(state)
+            else:
+                removed.append(cell)
+            changed.append(cell)
+            before.append(old_state)
+            after.append(state)
+        self.canvas_data.insert(new, CanvasTile.unpack_all(new_states))
+        self.canvas_data.remove(removed)
+        self.cells_changed(changed, before, after)
+
+    def cells_changed(self, cells, before, after) -> None:
+        if cells:
+            self.history.changed(cells, before, after)
+            self.recompute_neighbours(cells)
+            self.mark_cells_dirty(cells)
 
     def canvas_add(self) -> None:
-        if mouse_btns()[0] and not self.menu.rect.collidepoint(mouse_pos()) and not self.object_drag_active:
-            current_cell = self.get_current_cell()
+        if self.mouse.buttons[0] and not self.menu.rect.collidepoint(self.mouse.pos) and not self.object_drag_active:
             # Tiles
-            if EDITOR_DATA[self.selection_index]['type'] == 'tile':
-                if current_cell != self.last_selected_cell:
-                    if current_cell in self.canvas_data:
-                        self.canvas_data[current_cell].add_id(self.selection_index)
-                    else:
-                        self.canvas_data[current_cell] = CanvasTile(self.selection_index)
-                    self.check_neighbours(current_cell)
-                    self.last_selected_call = current_cell
+            if self.selection_index in TILES.tile_ids:
+                self.paint(erase = False)
             # Objects
             else:
                 if not self.object_timer.active:
                     groups = [self.canvas_objects]
-                    if EDITOR_DATA[self.selection_index]['style'] == 'palm_bg':groups.append(self.bg_objects)
+                    if self.selection_index in TILES.palm_bg_ids:groups.append(self.bg_objects)
                     else: groups.append(self.fg_objects) 
-                    CanvasObject(
-                        pos=mouse_pos(),
+                    sprite = CanvasObject(
+                        pos=self.mouse.pos,
                         frames = self.animations[self.selection_index]['frames'],
                         tile_id= self.selection_index,
                         origin = self.origin,
                         groups = groups)
+                    self.record_object(sprite, None, tuple(sprite.distance_to_origin))
                     self.object_timer.activate()
     
     def canvas_remove(self) -> None:
-        if mouse_btns()[2] and not self.menu.rect.collidepoint((mouse_pos())):
+        if self.mouse.buttons[2] and not self.menu.rect.collidepoint(self.mouse.pos):
+            # delete tiles, first so the objects deleted on the way are undone with them
+            if self.selection_index in TILES.tile_ids:
+                self.paint(erase = True)
             # delete object
             selected_object = self.mouse_on_object()
-            if selected_object and EDITOR_DATA[selected_object.tile_id]['style'] not in ('player', 'sky'):
+            if selected_object and selected_object.tile_id not in TILES.fixed_ids:
+                self.record_object(selected_object, tuple(selected_object.distance_to_origin), None)
                 selected_object.kill()
-            # delete tiles
-            if self.canvas_data:
-                current_cell = self.get_current_cell()
-                if current_cell in self.canvas_data:
-                    self.canvas_data[current_cell].remove_id(self.selection_index)
-                
-                    if self.canvas_data[current_cell].is_empty:
-                        del self.canvas_data[current_cell]
-                    self.check_neighbours(current_cell)
     
+    def region_input(self, event) -> None:
+        on_canvas = not self.menu.rect.collidepoint(self.mouse.pos)
+        if event.type == pygame.MOUSEBUTTONDOWN and on_canvas and not self.region_mode and event.button in (1, 3):
+            mods = pygame.key.get_mods()
+            if mods & pygame.KMOD_SHIFT:
+                self.region_mode = 'fill' if event.button == 1 else 'erase'
+            elif mods & pygame.KMOD_CTRL and event.button == 1:
+                self.region_mode = 'copy'
+            if self.region_mode:
+                self.end_stroke()
+                self.region_start = self.get_current_cell()
+        if event.type == pygame.MOUSEBUTTONUP and self.region_mode and event.button == (3 if self.region_mode == 'erase' else 1):
+            end = self.get_current_cell()
+            match self.region_mode:
+                case 'fill': self.fill_region(self.region_start, end, self.selection_index)
+                case 'erase': self.fill_region(self.region_start, end, self.selection_index, erase = True)
+                case 'copy': self.copy_region(self.region_start, end)
+            self.region_mode = None
+            self.region_start = None
+            self.region_done = True
+        if event.type == pygame.KEYDOWN and on_canvas:
+            if event.key == pygame.K_v and event.mod & pygame.KMOD_CTRL:
+                self.paste_region(self.get_current_cell())
+            if event.key == pygame.K_f and not event.mod & pygame.KMOD_CTRL:
+                self.flood_fill(self.get_current_cell(), self.selection_index)
+
+    def fill_region(self, start, end, tile_id, erase = False) -> None:
+        if tile_id not in TILES.tile_ids:
+            return
+        self.history.begin(None)
+        self.apply_cells(rect_cells(start, end), tile_id, erase)
+        self.history.commit()
+
+    def flood_fill(self, cell_pos, tile_id) -> None:
+        # the cells that look like the start cell, within the canvas or the screen if it reaches further
+        if tile_id not in TILES.tile_ids:
+            return
+        get = self.canvas_data.tiles.get
+        state = get(cell_pos, EMPTY_TILE).pack()
+        if CanvasTile.state_with(state, tile_id) == state:
+            return
+        cols, rows = self.fill_bounds()
+        cells = flood_cells(cell_pos, lambda cell: get(cell, EMPTY_TILE).pack() == state, cols, rows, FLOOD_FILL_LIMIT)
+        self.history.begin(None)
+        self.apply_cells(cells, tile_id)
+        self.history.commit()
+
+    def fill_bounds(self) -> tuple[range, range]:
+        view = self.display_surface.get_rect()
+        left, top = (view.left - self.origin.x) // TILE_SIZE, (view.top - self.origin.y) // TILE_SIZE
+        right, bottom = (view.right - self.origin.x) // TILE_SIZE, (view.bottom - self.origin.y) // TILE_SIZE
+        chunks = self.canvas_data.chunks
+        if chunks:
+            size = self.canvas_data.chunk_size
+            left = min(left, min(col for col, row in chunks) * size)
+            top = min(top, min(row for col, row in chunks) * size)
+            right = max(right, (max(col for col, row in chunks) + 1) * size - 1)
+            bottom = max(bottom, (max(row for col, row in chunks) + 1) * size - 1)
+        return range(int(left), int(right) + 1), range(int(top), int(bottom) + 1)
+
+    def copy_region(self, start, end) -> None:
+        cols, rows = region_bounds(start, end)
+        get = self.canvas_data.tiles.get
+        cells = {}
+        for col, row in rect_cells(start, end):
+            tile = get((col, row))
+            if tile:
+                cells[(col - cols.start, row - rows.start)] = tile.pack()
+        topleft = vector(cols.start, rows.start) * TILE_SIZE
+        objects = []
+        for sprite in self.canvas_objects:
+            col, row = self.get_current_cell(sprite)
+            if sprite.tile_id not in TILES.fixed_ids and col in cols and row in rows:
+                objects.append((sprite.tile_id, tuple(sprite.distance_to_origin - topleft)))
+        self.clipboard = Clipboard(cells, objects)
+
+    def paste_region(self, cell_pos) -> None:
+        if not self.clipboard:
+            return
+        col, row = cell_pos
+        self.history.begin(None)
+        self.apply_states([(col + x, row + y) for x, y in self.clipboard.cells], self.clipboard.cells.values())
+        topleft = vector(cell_pos) * TILE_SIZE
+        for tile_id, offset in self.clipboard.objects:
+            groups = [self.canvas_objects, self.bg_objects if tile_id in TILES.palm_bg_ids else self.fg_objects]
+            sprite = CanvasObject(
+                pos = (0, 0),
+                frames = self.animations[tile_id]['frames'],
+                tile_id = tile_id,
+                origin = self.origin,
+                groups = groups)
+            sprite.distance_to_origin = topleft + offset
+            sprite.pan_pos(self.origin)
+            self.record_object(sprite, None, tuple(sprite.distance_to_origin))
+        self.history.commit()
+
     def object_drag(self, event) -> None:
-        if event.type == pygame.MOUSEBUTTONDOWN and mouse_btns()[0]:
+        if self.region_mode:
+            return
+        if event.type == pygame.MOUSEBUTTONDOWN and self.mouse.buttons[0]:
             for sprite in self.canvas_objects:
                 if sprite.rect.collidepoint(event.pos):
                     sprite.start_drag()
+                    self.drag_starts[sprite] = tuple(sprite.distance_to_origin)
                     self.object_drag_active = True
         if event.type == pygame.MOUSEBUTTONUP and self.object_drag_active:
             for sprite in self.canvas_objects:
                 if sprite.selected:
                     sprite.end_drag(self.origin)
                     self.object_drag_active = False
+                    self.history.begin(('move', sprite))
+                    self.record_object(sprite, self.drag_starts.pop(sprite, None), tuple(sprite.distance_to_origin))
+                    self.history.commit()
+    
+    def record_object(self, sprite, before, after) -> None:
+        # part of the running stroke, or a step of its own
+        if self.history.recording:
+            self.history.object(sprite, sprite.groups(), before, after)
+        else:
+            self.history.begin(None)
+            self.history.object(sprite, sprite.groups(), before, after)
+            self.history.commit()
+
+    def end_stroke(self) -> None:
+        self.stroke = None
+        self.history.commit()
+
+    def undo(self) -> None:
+        self.restore(self.history.undo(), undo = True)
+
+    def redo(self) -> None:
+        self.restore(self.history.redo(), undo = False)
+
+    def restore(self, edit, undo) -> None:
+        self.stroke = None
+        if edit is None:
+            return
+        # autotiling only changes around the restored cells
+        self.apply_states(*edit.cell_states(undo))
+        for sprite, groups, pos in edit.object_states(undo):
+            if pos is None:
+                sprite.kill()
+                continue
+            if not sprite.alive():
+                sprite.add(*groups)
+            sprite.distance_to_origin = vector(pos)
+            sprite.pan_pos(self.origin)
     
 
     # drawing
@@ -301,23 +671,33 @@ class Editor:
             x=self.origin.x - int(self.origin.x / TILE_SIZE) * TILE_SIZE,
             y=self.origin.y - int(self.origin.y / TILE_SIZE) * TILE_SIZE,
         )
-        self.support_line_surf.fill("green")
-        for col in range(cols + 1):
-            x = origin_offset.x + col * TILE_SIZE
-            pygame.draw.line(
-                self.support_line_surf, LINE_COLOR, (x, 0), (x, WINDOW_HEIGHT)
-            )
-        for row in range(rows + 1):
-            y = origin_offset.y + row * TILE_SIZE
-            pygame.draw.line(
-                self.support_line_surf, LINE_COLOR, (0, y), (WINDOW_WIDTH, y)
-            )
+        # the lines only have to be redrawn when the grid moved
+        if origin_offset != self.support_line_offset:
+            self.support_line_offset = origin_offset
+            self.support_line_surf.fill("green")
+            for col in range(cols + 1):
+                x = origin_offset.x + col * TILE_SIZE
+                pygame.draw.line(
+                    self.support_line_surf, LINE_COLOR, (x, 0), (x, WINDOW_HEIGHT)
+                )
+            for row in range(rows + 1):
+                y = origin_offset.y + row * TILE_SIZE
+                pygame.draw.line(
+                    self.support_line_surf, LINE_COLOR, (0, y), (WINDOW_WIDTH, y)
+                )
         self.display_surface.blit(self.support_line_surf, (0, 0))
 
     def draw_level(self) -> None:
         self.bg_objects.draw(self.display_surface)
-        for cell_pos, tile in self.canvas_data.items():
+        # only cells that can reach into the clip area are drawn, enemies are wider than a tile
+        clip = self.display_surface.get_clip()
+        area = pygame.Rect(clip.x - TILE_SIZE - 8, clip.y - TILE_SIZE, clip.width + TILE_SIZE + 16, clip.height + TILE_SIZE)
+        visible_cells = self.visible_cells(clip)
+        profiler.count('cells', len(visible_cells))
+        for cell_pos, tile in visible_cells:
             pos = self.origin + vector(cell_pos) * TILE_SIZE
+            if not area.collidepoint(pos):
+                continue
             # water
             if tile.has_water:
                 if tile.water_on_top:
@@ -329,28 +709,25 @@ class Editor:
                     self.display_surface.blit(surf, pos)
             # coins
             if tile.coin:
-                frames = self.animations[tile.coin]['frames']
-                index = int(self.animations[tile.coin]['frame_index'])
-                surf = frames[index]
-                rect = surf.get_rect(center= (pos.x + TILE_SIZE//2, pos.y + TILE_SIZE//2))
-                self.display_surface.blit(surf, rect)
+                animation = self.animations[tile.coin]
+                surf = animation['frames'][int(animation['frame_index'])]
+                self.display_surface.blit(surf, pos + animation['offset'])
             # enemies
             if tile.enemy:
-                frames = self.animations[tile.enemy]['frames']
-                index = int(self.animations[tile.enemy]['frame_index'])
-                surf = frames[index]
-                rect = surf.get_rect(midbottom= (pos.x + TILE_SIZE//2, pos.y + TILE_SIZE))
-                self.display_surface.blit(surf, rect)
+                animation = self.animations[tile.enemy]
+                surf = animation['frames'][int(animation['frame_index'])]
+                self.display_surface.blit(surf, pos + animation['offset'])
             # terrain
             if tile.has_terrain:
-                terrain_string = ''.join(tile.terrain_neighbours)
-                terrain_style = terrain_string if terrain_string in self.land_tiles else 'X'
-                self.display_surface.blit(self.land_tiles[terrain_style], pos)
+                self.display_surface.blit(tile.terrain_surf, pos)
         self.fg_objects.draw(self.display_surface)
     
     def preview(self) -> None:
+        if self.region_mode:
+            pygame.draw.rect(self.display_surface, LINE_COLOR, self.region_rect(), 3)
+            return
         selected_object = self.mouse_on_object()
-        if not self.menu.rect.collidepoint(mouse_pos()):    
+        if not self.menu.rect.collidepoint(self.mouse.pos):    
             if selected_object:
                 rect = selected_object.rect.inflate(10,10)
                 color = 'black'
@@ -373,19 +750,35 @@ class Editor:
                 
             else:
                 # preview
-                type_dict = {key: value['type'] for key,value in EDITOR_DATA.items()}
-                surf = self.preview_surfs[self.selection_index].copy()
-                surf.set_alpha(200)
+                surf = transforms.alpha(self.preview_surfs[self.selection_index], 200)
                 # tile
-                if type_dict[self.selection_index] == 'tile':
+                if self.selection_index in TILES.tile_ids:
                     current_cell = self.get_current_cell()
                     rect = surf.get_rect(topleft = self.origin + vector(current_cell) * TILE_SIZE)
                 # object
                 else:
-                    rect = surf.get_rect(center = mouse_pos())
+                    rect = surf.get_rect(center = self.mouse.pos)
                 self.display_surface.blit(surf, rect)
     
-    def display_sky(self, dt) -> None:
+    def region_rect(self) -> pygame.Rect:
+        cols, rows = region_bounds(self.region_start, self.get_current_cell())
+        return self.cell_rect((cols.start, rows.start)).union(self.cell_rect((cols[-1], rows[-1])))
+
+    def preview_area(self) -> pygame.Rect | None:
+        # screen area covered by preview()
+        if self.region_mode:
+            return self.region_rect().inflate(8, 8)
+        if self.menu.rect.collidepoint(self.mouse.pos):
+            return None
+        selected_object = self.mouse_on_object()
+        if selected_object:
+            return selected_object.rect.inflate(16, 16)
+        surf = self.preview_surfs[self.selection_index]
+        if self.selection_index in TILES.tile_ids:
+            return surf.get_rect(topleft = self.origin + vector(self.get_current_cell()) * TILE_SIZE)
+        return surf.get_rect(center = self.mouse.pos)
+
+    def display_sky(self) -> None:
         self.display_surface.fill(SKY_COLOR)
         y = self.sky_handle.rect.centery
 
@@ -397,7 +790,7 @@ class Editor:
             pygame.draw.rect(self.display_surface, HORIZON_TOP_COLOR, horizon_rect1)
             pygame.draw.rect(self.display_surface, HORIZON_TOP_COLOR, horizon_rect2)
             pygame.draw.rect(self.display_surface, HORIZON_TOP_COLOR, horizon_rect3)
-            self.display_clouds(dt, y)
+            self.display_clouds(y)
         
         # sea
         if 0< y < WINDOW_HEIGHT:
@@ -407,56 +800,161 @@ class Editor:
         if y <= 0:
             self.display_surface.fill(SEA_COLOR)
     
-    def display_clouds(self, dt, horizon_y) -> None:
-        for cloud in self.current_clouds: #[{surf, pos, speed}]
-            cloud['pos'][0] -= cloud ['speed'] * dt
-            x = cloud['pos'][0]
-            y = horizon_y - cloud['pos'][1]
-            self.display_surface.blit(cloud['surf'], (x,y))             
+    def update_clouds(self, dt) -> None:
+        horizon_y = self.sky_handle.rect.centery
+        # clouds only drift while the sky is visible
+        if horizon_y > 0:
+            previous = self.clouds.update(dt)
+            if self.dirty_rects_enabled:
+                for rect in self.clouds.moved_rects(previous, horizon_y):
+                    self.mark_dirty(rect)
+
+    def display_clouds(self, horizon_y) -> None:
+        self.clouds.draw(self.display_surface, horizon_y)
     
     def create_clouds(self, event) -> None:
         if event.type == self.cloud_timer:
-            surf = choice(self.cloud_surf)
-            surf = pygame.transform.scale2x(surf) if randint(0,4) < 2 else surf
+            image = choice(range(len(self.cloud_surf)))
+            scaled = randint(0,4) < 2
             pos = [WINDOW_WIDTH + randint(50,100),randint(0,WINDOW_HEIGHT)]
             speed = randint(20,50)
-            self.current_clouds.append({'surf':surf, 'pos': pos, 'speed': speed})
+            self.clouds.spawn(*pos, speed, image, scaled)
             # remove clouds
-            self.current_clouds = [cloud for cloud in self.current_clouds if cloud['pos'][0] > -400]
+            self.clouds.cull(-400)
     
     def startup_clouds(self) -> None:
         for i in range(20):
-            surf = choice(self.cloud_surf)
-            surf = pygame.transform.scale2x(surf) if randint(0,4) < 2 else surf
+            image = choice(range(len(self.cloud_surf)))
+            scaled = randint(0,4) < 2
             pos = [randint(0,WINDOW_WIDTH),randint(0,WINDOW_HEIGHT-self.sky_handle.rect.bottom)]
             speed = randint(15,45)
-            self.current_clouds.append({'surf':surf, 'pos': pos, 'speed': speed})
+            self.clouds.spawn(*pos, speed, image, scaled)
             
     
-    # update
-    def run(self, dt) -> None:
-        self.event_loop()
-        # updating
-        self.animation_update(dt)
-        self.canvas_objects.update(dt)
-        self.object_timer.update()
-        self.switch_timer.update()
+    # dirty rects
+    def mark_dirty(self, rect) -> None:
+        if self.dirty_rects_enabled:
+            self.marked_rects.append(pygame.Rect(rect))
 
-        # drawing
+    def mark_cells_dirty(self, cells) -> None:
+        # an edit changes the neighbouring terrain as well
+        if not self.dirty_rects_enabled:
+            return
+        cols = [col for col, row in cells]
+        rows = [row for col, row in cells]
+        area = self.cell_rect((min(cols), min(rows))).union(self.cell_rect((max(cols), max(rows))))
+        self.mark_dirty(area.inflate(TILE_SIZE * 2 + 16, TILE_SIZE * 2 + 16))
+
+    def track_changes(self) -> None:
+        # panning and moving the horizon change the whole screen
+        view = (self.origin.copy(), self.sky_handle.rect.centery)
+        if view != self.drawn_view:
+            self.redraw_all = True
+            self.drawn_view = view
+        if self.selection_index != self.drawn_selection_index:
+            self.mark_dirty(self.menu.rect.inflate(10, 10))
+            self.drawn_selection_index = self.selection_index
+        # animated tiles on screen
+        if self.changed_animations:
+            screen_rect = self.display_surface.get_rect()
+            for cell_pos, tile in self.visible_cells(screen_rect):
+                if (tile.has_water and not tile.water_on_top and 3 in self.changed_animations) \
+                    or tile.coin in self.changed_animations or tile.enemy in self.changed_animations:
+                    rect = self.cell_rect(cell_pos, margin = 8)
+                    if screen_rect.colliderect(rect):
+                        self.mark_dirty(rect)
+        # canvas objects that moved, animated or got deleted
+        object_states = {}
+        for sprite in self.canvas_objects:
+            state = (sprite.image, sprite.rect.copy())
+            object_states[sprite] = state
+            if self.object_states.get(sprite) != state:
+                self.mark_dirty(sprite.rect)
+                if sprite in self.object_states:
+                    self.mark_dirty(self.object_states[sprite][1])
+        for sprite, (image, rect) in self.object_states.items():
+            if sprite not in object_states:
+                self.mark_dirty(rect)
+        self.object_states = object_states
+        # preview under the mouse
+        preview_rect = self.preview_area()
+        if (preview_rect, self.selection_index) != self.last_preview:
+            for rect in (preview_rect, self.last_preview[0]):
+                if rect:
+                    self.mark_dirty(rect)
+            self.last_preview = (preview_rect, self.selection_index)
+
+    def collect_dirty_rects(self) -> list[pygame.Rect]:
+        screen_rect = self.display_surface.get_rect()
+        if self.redraw_all:
+            return [screen_rect]
+        rects = []
+        for rect in self.marked_rects:
+            rect = rect.clip(screen_rect)
+            if not rect.width or not rect.height:
+                continue
+            # merge overlapping rects
+            overlaps = rect.collidelistall(rects)
+            while overlaps:
+                for index in reversed(overlaps):
+                    rect.union_ip(rects.pop(index))
+                overlaps = rect.collidelistall(rects)
+            rects.append(rect)
+        # every rect is a full redraw pass, past a few it is cheaper to do a single one
+        if len(rects) > 6:
+            rects = [rects[0].unionall(rects[1:])]
+        return rects
+
+    # update
+    def draw(self) -> None:
         self.display_surface.fill("gray")
-        self.display_sky(dt)
-        self.draw_level()
+        self.display_sky()
+        with profiler.phase('draw_level'):
+            self.draw_level()
         self.draw_tile_lines()
         # pygame.draw.circle(self.display_surface, "red", self.origin, 10)
         self.preview()
         self.menu.display(self.selection_index)
 
+    def run(self, dt, pending = ()) -> None:
+        with profiler.phase('events'):
+            self.event_loop(pending)
+        # updating
+        with profiler.phase('animation_update'):
+            self.animation_update(dt)
+        with profiler.phase('update'):
+            self.canvas_objects.update(dt)
+            self.update_clouds(dt)
+        self.object_timer.update()
+        self.switch_timer.update()
+
+        # drawing
+        if not self.dirty_rects_enabled:
+            with profiler.phase('draw'):
+                self.draw()
+            return
+        self.track_changes()
+        self.dirty_rects = self.collect_dirty_rects()
+        with profiler.phase('draw'):
+            for rect in self.dirty_rects:
+                self.display_surface.set_clip(rect)
+                self.draw()
+        self.display_surface.set_clip(None)
+        profiler.count('dirty rects', len(self.dirty_rects))
+        self.marked_rects.clear()
+        self.redraw_all = False
+
 
 class CanvasTile:
-    def __init__(self, tile_id, offset = vector()) -> None:
+    # canvases can hold a million of these, objects are kept as sprites and not on the tiles
+    __slots__ = ('has_terrain', 'terrain_mask', 'terrain_surf', 'has_water', 'water_on_top', 'coin', 'enemy')
+
+    def __init__(self, tile_id) -> None:
         # terrain
         self.has_terrain = False
-        self.terrain_neighbours = []
+        self.terrain_mask = 0
+        # set by the editor whenever a neighbour changes
+        self.terrain_surf = None
         # water
         self.has_water = False
         self.water_on_top = False
@@ -464,41 +962,85 @@ class CanvasTile:
         self.coin = None  # 4, 5, 6
         # enemy
         self.enemy = None
-        # objects
-        self.objects: list[CanvasObject] = []
-        self.add_id(tile_id, offset=offset)
-        self.is_empty = False
+        self.add_id(tile_id)
 
-    def add_id(self, tile_id, offset = vector()) -> None:
-        options = {key: value["style"] for key, value in EDITOR_DATA.items()}
-        match options[tile_id]:
+    def add_id(self, tile_id) -> None:
+        match TILES.styles[tile_id]:
             case "terrain": self.has_terrain = True
             case "water": self.has_water = True
             case "coin": self.coin = tile_id
             case "enemy": self.enemy = tile_id
-            case _:
-                if (tile_id, offset) not in self.objects:
-                    self.objects.append((tile_id,offset))
+            case _: raise ValueError(f'{tile_id} is not a tile id')
             
-    def remove_id(self, tile_id) -> None:
-        options = {key: value["style"] for key, value in EDITOR_DATA.items()}
-        match options[tile_id]:
-            case "terrain": self.has_terrain = False
-            case "water": self.has_water = False
-            case "coin": self.coin = None
-            case "enemy": self.enemy = None
-            case _: print("invalid tile")
-        self.check_content()
-
-    def check_content(self) -> None:
-        if not self.has_terrain and not self.has_water and not self.coin and not self.enemy:
-            self.is_empty = True
+    def pack(self) -> int:
+        # the content as one int for the undo history, 0 is an empty cell
+        return self.has_terrain | self.has_water << 1 | (self.coin or 0) << 2 | (self.enemy or 0) << 7
+
+    @staticmethod
+    def slot(tile_id, erase = False) -> tuple[str, object]:
+        # where a tile id is kept and the value with the id added or taken off
+        match TILES.styles[tile_id]:
+            case "terrain": return 'has_terrain', not erase
+            case "water": return 'has_water', not erase
+            case "coin": return 'coin', None if erase else tile_id
+            case "enemy": return 'enemy', None if erase else tile_id
+        raise ValueError(f'{tile_id} is not a tile id')
+
+    @staticmethod
+    def state_with(state, tile_id) -> int:
+        match TILES.styles[tile_id]:
+            case "terrain": return state | 1
+            case "water": return state | 2
+            case "coin": return state & ~(31 << 2) | tile_id << 2
+            case "enemy": return state & ~(31 << 7) | tile_id << 7
+        return state
+
+    @staticmethod
+    def state_without(state, tile_id) -> int:
+        match TILES.styles[tile_id]:
+            case "terrain": return state & ~1
+            case "water": return state & ~2
+            case "coin": return state & ~(31 << 2)
+            case "enemy": return state & ~(31 << 7)
+        return state
+
+    def load(self, state) -> None:
+        # the content of a packed state, the neighbour fields are left to the next neighbour pass
+        self.has_terrain = bool(state & 1)
+        self.has_water = bool(state & 2)
+        self.coin = (state >> 2 & 31) or None
+        self.enemy = (state >> 7 & 31) or None
+
+    @classmethod
+    def unpack(cls, state) -> 'CanvasTile':
+        tile = cls.__new__(cls)
+        tile.terrain_mask = 0
+        tile.terrain_surf = None
+        tile.water_on_top = False
+        tile.load(state)
+        return tile
+
+    @classmethod
+    def unpack_all(cls, states) -> list['CanvasTile']:
+        # unpack for many states, the tiles of a filled area are built in one loop
+        tiles = []
+        for state in states:
+            tile = cls.__new__(cls)
+            tile.terrain_mask = 0
+            tile.terrain_surf = None
+            tile.water_on_top = False
+            tile.has_terrain = bool(state & 1)
+            tile.has_water = bool(state & 2)
+            tile.coin = (state >> 2 & 31) or None
+            tile.enemy = (state >> 7 & 31) or None
+            tiles.append(tile)
+        return tiles
 
     def get_water(self) -> str:
         return 'bottom' if self.water_on_top else 'top'
-    
-    def get_terrain(self) -> str:
-        return ''.join(self.terrain_neighbours)
+
+# stands in for missing cells
+EMPTY_TILE = CanvasTile.unpack(0)
 
 class CanvasObject(pygame.sprite.Sprite):
     def __init__(self, pos, frames, tile_id, origin, groups) -> None:
@@ -508,7 +1050,9 @@ class CanvasObject(pygame.sprite.Sprite):
         self.frames = frames
         self.frame_index = 0
         self.image = self.frames[self.frame_index]
-        self.rect = self.image.get_rect(center = pos)
+        # frames share one size, the rect is made once and only moves
+        self.rect = pygame.Rect((0, 0), self.frames.size)
+        self.rect.center = pos
         # movement
         self.distance_to_origin = vector(self.rect.topleft) - origin
         self.selected = False
@@ -528,10 +1072,9 @@ class CanvasObject(pygame.sprite.Sprite):
     
     def animate(self, dt) -> None:
         self.frame_index += ANIMATION_SPEED * dt
-        if self.frame_index >= len(self.frames):
+        if self.frame_index >= self.frames.count:
             self.frame_index = 0
         self.image = self.frames[int(self.frame_index)]
-        self.rect = self.image.get_rect(midbottom = self.rect.midbottom)
 
     def pan_pos(self, origin) -> None:
         self.rect.topleft = origin + self.distance_to_origin
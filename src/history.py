@@ -0,0 +1,149 @@
+from array import array
+from collections import deque
+from itertools import chain, compress
+from operator import ne
+
+import pygame
+
+from settings import UNDO_CELLS, UNDO_COALESCE, UNDO_STEPS
+
+
+class Edit:
+    # one undo step, cells are packed into arrays: col and row pairs, and the packed tile state before and after
+    __slots__ = ('kind', 'cells', 'before', 'after', 'objects', 'time')
+
+    def __init__(self, kind, cells: list, before: list, after: list, objects: list, time) -> None:
+        # every cell once, with its state before and after
+        self.kind = kind
+        changed = list(map(ne, before, after))
+        if not all(changed):
+            cells, before, after = compress(cells, changed), compress(before, changed), compress(after, changed)
+        self.cells = array('i', list(chain.from_iterable(cells)))
+        self.before = array('I', before)
+        self.after = array('I', after)
+        # (sprite, groups, position before, position after), None where the sprite is not on the canvas
+        self.objects = [change for change in objects if change[2] != change[3]]
+        self.time = time
+
+    def __len__(self) -> int:
+        return len(self.before) + len(self.objects)
+
+    def unpack(self) -> tuple[list, array, array]:
+        # the cells as a batch for History.changed
+        return list(zip(self.cells[::2], self.cells[1::2])), self.before, self.after
+
+    def cell_states(self, undo) -> tuple[list[tuple[int, int]], array]:
+        return list(zip(self.cells[::2], self.cells[1::2])), self.before if undo else self.after
+
+    def object_states(self, undo) -> list[tuple]:
+        if undo:
+            return [(sprite, groups, before) for sprite, groups, before, after in reversed(self.objects)]
+        return [(sprite, groups, after) for sprite, groups, before, after in self.objects]
+
+
+class History:
+    def __init__(self, steps = UNDO_STEPS, cell_limit = UNDO_CELLS, coalesce = UNDO_COALESCE, clock = None) -> None:
+        self.steps = steps
+        self.cell_limit = cell_limit
+        # ms between two edits of the same kind that still makes them one step
+        self.coalesce = coalesce
+        self.clock = clock or pygame.time.get_ticks
+        self.undo_stack: deque[Edit] = deque()
+        self.redo_stack: list[Edit] = []
+        # cells and objects held by the undo stack
+        self.size = 0
+        # the edit being recorded
+        self.kind = None
+        # (cells, states before, states after) as the editor hands them in
+        self.batches: list[tuple[list, list, list]] = []
+        self.objects: list[tuple] = []
+        self.recording = False
+
+    def begin(self, kind) -> None:
+        if self.recording:
+            self.commit()
+        self.kind = kind
+        self.recording = True
+
+    def changed(self, cells, before, after) -> None:
+        # a batch of cells, each one at most once
+        if not self.recording:
+            return
+        self.batches.append((cells, before, after))
+
+    def merged(self, batches) -> tuple[dict, dict]:
+        # the first state before and the last state after count
+        before, after = {}, {}
+        setdefault = before.setdefault
+        for cells, batch_before, batch_after in batches:
+            for cell, state in zip(cells, batch_before):
+                setdefault(cell, state)
+            after.update(zip(cells, batch_after))
+        return before, after
+
+    def object(self, sprite, groups, before, after) -> None:
+        if not self.recording:
+            return
+        self.objects.append((sprite, tuple(groups), before, after))
+
+    def commit(self) -> None:
+        if not self.recording:
+            return
+        now = self.clock()
+        last = self.undo_stack[-1] if self.undo_stack else None
+        if last and not self.redo_stack and self.kind is not None and last.kind == self.kind and now - last.time <= self.coalesce:
+            # consecutive strokes of the same kind are undone together
+            self.undo_stack.pop()
+            self.size -= len(last)
+            before, after = self.merged([last.unpack()] + self.batches)
+            edit = Edit(self.kind, list(before), list(before.values()), list(after.values()), last.objects + self.objects, now)
+        elif len(self.batches) > 1:
+            before, after = self.merged(self.batches)
+            edit = Edit(self.kind, list(before), list(before.values()), list(after.values()), self.objects, now)
+        else:
+            # a fill or an undone step, nothing to merge
+            cells, before, after = self.batches[0] if self.batches else ([], [], [])
+            edit = Edit(self.kind, cells, before, after, self.objects, now)
+        if self.batches or self.objects:
+            self.redo_stack.clear()
+        self.kind = None
+        self.batches = []
+        self.objects = []
+        self.recording = False
+        if len(edit):
+            self.push(edit)
+
+    def push(self, edit) -> None:
+        self.undo_stack.append(edit)
+        self.size += len(edit)
+        # the oldest steps go first, the newest one is always kept
+        while len(self.undo_stack) > 1 and (len(self.undo_stack) > self.steps or self.size > self.cell_limit):
+            self.size -= len(self.undo_stack.popleft())
+
+    def undo(self) -> Edit | None:
+        self.commit()
+        if not self.undo_stack:
+            return None
+        edit = self.undo_stack.pop()
+        self.size -= len(edit)
+        self.redo_stack.append(edit)
+        return edit
+
+    def redo(self) -> Edit | None:
+        self.commit()
+        if not self.redo_stack:
+            return None
+        edit = self.redo_stack.pop()
+        # a redone step is never merged with the next edit
+        edit.time = -self.coalesce - 1
+        self.push(edit)
+        return edit
+
+    def clear(self) -> None:
+        self.undo_stack.clear()
+        self.redo_stack.clear()
+        self.size = 0
+        self.kind = None
+        self.batches = []
+        self.objects = []
+        self.recording = False
@@ -1,18 +1,34 @@
 import sys
+from collections import OrderedDict
+from itertools import count
 from typing import Iterable
 
 from pygame.math import Vector2 as vector
 from settings import *
 from support import *
-from sprites import GenericSprite, AnimatedSprite, Player, Coin, Particle, Spikes, Tooth, Shell, Block, Pearl
+from sprites import GenericSprite, StaticChunk, AnimationClock, ClockedSprite, Player, Coin, Particle, Spikes, Tooth, Shell, Block, Pearl
+from level_file import load_level, save_level
+from profiler import profiler
+from replay import Recorder, state_checksum
+from spatial import SpatialHash
+from tiles import TILES
 from timer import Timer
 
 
 class Level:
-    def __init__(self, grid, switch, asset_dict) -> None:
+    def __init__(self, grid, switch, asset_dict, input_source = None, stream_margin = STREAM_MARGIN) -> None:
         self.display_surface = pygame.display.get_surface()
         self.switch = switch
         self.switch_timer = Timer(500)
+        self.grid = grid
+        # simulation time that has not been stepped yet
+        self.accumulator = 0.0
+        # simulation time in ms, the timers of the sprites run on it
+        self.ticks = 0.0
+        # input is read once per frame, from the keyboard or a replay
+        self.input_source = input_source
+        self.keys = None
+        self.recorder = Recorder(grid) if RECORD_REPLAYS else None
         # groups
         self.all_sprites = CameraGroup()
         self.bg_sprites = pygame.sprite.Group()
@@ -21,6 +37,33 @@ class Level:
         self.collision_sprites = pygame.sprite.Group()
         self.shell_sprites = pygame.sprite.Group()
         self.pearl_sprites = pygame.sprite.Group()
+        self.collision_grid = SpatialHash(TILE_SIZE)
+        # static tiles are baked into chunks
+        self.chunks: dict[tuple[str, int, int], StaticChunk] = {}
+        self.chunk_cache = ChunkCache(CHUNK_CACHE_SIZE)
+        # streaming
+        self.chunk_entries: dict[tuple[int, int], list[tuple[int, str, tuple, object]]] = {}
+        self.live_chunks: dict[tuple[int, int], list[pygame.sprite.Sprite]] = {}
+        self.stream_range = None
+        # None builds every chunk at the start and keeps it, to check that streaming does not change the game
+        self.stream_margin = stream_margin
+        # coins and shells are remembered by their place in the grid, their sprites come and go
+        self.entry_orders: dict[pygame.sprite.Sprite, int] = {}
+        self.collected_coins: set[int] = set()
+        self.shell_states: dict[int, tuple] = {}
+        # shells sleep until the player comes close
+        self.steps = 0
+        self.shell_zones = SpatialHash(TILE_SIZE * 4)
+        self.trigger_zones: dict[Shell, TriggerZone] = {}
+        self.awake_shells: set[Shell] = set()
+        # contacts, the static bodies are indexed once, pearls on every pass
+        self.coin_grid = SpatialHash(TILE_SIZE)
+        self.damage_grid = SpatialHash(TILE_SIZE)
+        self.contact_callbacks = {
+            'coin': self.collect_coin,
+            'damage': self.damage_player,
+            'pearl terrain': self.pop_pearl,
+        }
 
         self.build_level(grid, asset_dict)
 
@@ -28,122 +71,416 @@ class Level:
         self.particle_surfs = asset_dict['particle']
         self.pearl_surf = asset_dict['pearl']
 
+    def get_ticks(self) -> float:
+        return self.ticks
+
+    def frame_keys(self):
+        # the keyboard, for sprites updated outside of run
+        return self.keys if self.keys is not None else pygame.key.get_pressed()
+
+    @classmethod
+    def from_file(cls, path, switch, asset_dict) -> 'Level':
+        return cls(load_level(path), switch, asset_dict)
+
+    def save(self, path) -> None:
+        save_level(path, self.grid)
+
     def build_level(self, grid, asset_dict) -> None:
+        # the grid stays data, sprites only exist for the chunks around the camera
+        self.asset_dict = asset_dict
+        # one clock for every set of frames, instead of a frame index on every sprite
+        self.animation_clocks = {name: AnimationClock(asset_dict[name]) for name in ('water top', 'gold', 'silver', 'diamond')}
+        for name, frames in asset_dict['palms'].items():
+            self.animation_clocks[name] = AnimationClock(frames)
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        orders = count()
         for layer_name, layer in grid.items():
             for pos, data in layer.items():
-                if layer_name == 'terrain':
-                    GenericSprite(
+                entry = (next(orders), layer_name, pos, data)
+                if data == TILES.player_id:
+                    player_entry = entry
+                else:
+                    chunk = (int(pos[0] // chunk_pixels), int(pos[1] // chunk_pixels))
+                    self.chunk_entries.setdefault(chunk, []).append(entry)
+        # sprites made while playing are drawn above everything from the grid
+        self.all_sprites.counter = orders
+        self.spawn(player_entry)
+        self.stream()
+
+    def spawn(self, entry) -> list[pygame.sprite.Sprite]:
+        order, layer_name, pos, data = entry
+        asset_dict = self.asset_dict
+        clocks = self.animation_clocks
+        if layer_name == 'coins' and order in self.collected_coins:
+            return []
+        sprites = []
+        # whenever they are built, sprites are drawn and collided in the order of the grid
+        self.all_sprites.spawn_key = order
+        if layer_name == 'terrain':
+            sprites.append(GenericSprite(
+                pos= pos, 
+                surf= asset_dict['land'][data], 
+                groups= self.collision_sprites))
+            sprites.append(self.bake_tile(layer_name, pos, asset_dict['land'][data], LEVEL_LAYERS['main']))
+        if layer_name == 'water':
+            if data == 'top':
+                sprites.append(ClockedSprite(
+                    pos= pos,
+                    clock= clocks['water top'],
+                    groups= self.all_sprites,
+                    z= LEVEL_LAYERS['water']))
+            else:
+                sprites.append(self.bake_tile(layer_name, pos, asset_dict['water bottom'], LEVEL_LAYERS['water']))
+        # everything but terrain and water is an id from the editor
+        style = TILES.styles[data] if isinstance(data, int) else None
+        name = TILES.names[data] if style else None
+        match style:
+            case 'player': self.player = Player(pos, asset_dict['player'], self.all_sprites, self.collision_grid, self.frame_keys)
+            case 'sky': pass
+            case 'coin': sprites.append(Coin(pos, clocks[name], [self.all_sprites, self.coin_sprites], coin_type=name))
+            # enemies
+            case 'enemy':
+                match name:
+                    case 'spikes': sprites.append(Spikes(pos, asset_dict['spikes'],[self.all_sprites, self.damage_sprites]))
+                    case 'tooth': sprites.append(Tooth(pos, asset_dict['tooth'],[self.all_sprites, self.damage_sprites]))
+                    case 'shell_left' | 'shell_right': sprites.append(Shell(
+                        orientation=name.split('_')[1],
                         pos= pos, 
-                        surf= asset_dict['land'][data], 
-                        groups= [self.all_sprites,self.collision_sprites])
-                if layer_name == 'water':
-                    if data == 'top':
-                        AnimatedSprite(
-                            pos= pos,
-                            frames= asset_dict['water top'],
-                            groups= self.all_sprites,
-                            z= LEVEL_LAYERS['water'])
-                    else:
-                        GenericSprite(
-                            pos= pos, 
-                            surf= asset_dict['water bottom'], 
-                            groups= self.all_sprites,
-                            z= LEVEL_LAYERS['water'])
-                match data:
-                    case 0: self.player = Player(pos, asset_dict['player'], self.all_sprites, self.collision_sprites)
-                    case 1: pass # sky
-                    case 4: Coin(pos, asset_dict['gold'], [self.all_sprites, self.coin_sprites],coin_type='gold') 
-                    case 5: Coin(pos, asset_dict['silver'], [self.all_sprites, self.coin_sprites],coin_type='silver')
-                    case 6: Coin(pos, asset_dict['diamond'],[self.all_sprites, self.coin_sprites],coin_type='diamond')
-                    # enemies
-                    case 7: Spikes(pos, asset_dict['spikes'],[self.all_sprites, self.damage_sprites])
-                    case 8: Tooth(pos, asset_dict['tooth'],[self.all_sprites, self.damage_sprites])
-                    case 9: Shell(
-                                orientation='left', 
-                                pos= pos, 
-                                frames=asset_dict['shell'],
-                                groups=[self.all_sprites,self.collision_sprites,self.shell_sprites],
-                                create_pearl = self.create_pearl,
-                                damage_sprites = self.damage_sprites)
-                    case 10: Shell(
-                                orientation='right', 
-                                pos= pos, 
-                                frames=asset_dict['shell'],
-                                groups=[self.all_sprites,self.collision_sprites,self.shell_sprites],
-                                create_pearl = self.create_pearl,
-                                damage_sprites = self.damage_sprites)
-                    
-                    # palm trees
-                    case 11: 
-                        AnimatedSprite(pos, asset_dict['palms']['small_fg'], self.all_sprites)
-                        Block(pos, (76,50), self.collision_sprites)
-                    case 12: 
-                        AnimatedSprite(pos, asset_dict['palms']['large_fg'], self.all_sprites)
-                        Block(pos, (76,50), self.collision_sprites)
-                    case 13: 
-                        AnimatedSprite(pos, asset_dict['palms']['left_fg' ], self.all_sprites)
-                        Block(pos, (76,50), self.collision_sprites)
-                    case 14: 
-                        AnimatedSprite(pos, asset_dict['palms']['right_fg'], self.all_sprites)
-                        Block(pos+vector(50,0), (76,50), self.collision_sprites)
-
-                    case 15: AnimatedSprite(pos, asset_dict['palms']['small_bg'], self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 16: AnimatedSprite(pos, asset_dict['palms']['large_bg'], self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 17: AnimatedSprite(pos, asset_dict['palms']['left_bg' ], self.all_sprites, LEVEL_LAYERS['bg'])
-                    case 18: AnimatedSprite(pos, asset_dict['palms']['right_bg'], self.all_sprites, LEVEL_LAYERS['bg'])
-                    case '_': print('Error creating object')
-        for sprite in self.shell_sprites:
-            setattr(sprite, 'player', self.player)
+                        frames=asset_dict['shell'],
+                        groups=[self.all_sprites,self.collision_sprites,self.shell_sprites],
+                        create_pearl = self.create_pearl,
+                        damage_sprites = self.damage_sprites,
+                        clock = self.get_ticks))
+
+            # palm trees, the right one leans over and stands further right
+            case 'palm_fg':
+                sprites.append(ClockedSprite(pos, clocks[name], self.all_sprites))
+                offset = vector(50, 0) if name == 'right_fg' else vector()
+                sprites.append(Block(pos + offset, (76,50), self.collision_sprites))
+            case 'palm_bg': sprites.append(ClockedSprite(pos, clocks[name], self.all_sprites, LEVEL_LAYERS['bg']))
+        self.all_sprites.spawn_key = None
+
+        sprites = [sprite for sprite in sprites if sprite]
+        for sprite in sprites:
+            # every collision sprite is static, so the player only has to look at nearby cells
+            if sprite in self.collision_sprites:
+                self.collision_grid.add(sprite, order)
+            if sprite in self.shell_sprites:
+                sprite.player = self.player
+                self.entry_orders[sprite] = order
+                self.add_shell(sprite)
+            if sprite in self.coin_sprites:
+                self.entry_orders[sprite] = order
+                self.coin_grid.add(sprite, order)
+            if sprite in self.damage_sprites:
+                self.damage_grid.add(sprite, order)
+        return sprites
+
+    def add_shell(self, shell) -> None:
+        # without a saved state the shell has been asleep since the start
+        state = self.shell_states.pop(self.entry_orders[shell], None)
+        if state:
+            frame_index, sleep_step, shell.attack_cooldown.active, shell.attack_cooldown.start_time = state
+            shell.frame_index = frame_index
+            shell.sleep(sleep_step)
+        else:
+            shell.sleep(0)
+        self.trigger_zones[shell] = TriggerZone(shell, shell.trigger_zone(SHELL_WAKE_MARGIN))
+        self.shell_zones.add(self.trigger_zones[shell])
+
+    def remove_shell(self, shell) -> None:
+        if not shell.asleep:
+            shell.sleep(self.steps)
+        self.awake_shells.discard(shell)
+        self.shell_zones.remove(self.trigger_zones.pop(shell))
+        self.shell_states[self.entry_orders[shell]] = (
+            shell.frame_index, shell.sleep_step, shell.attack_cooldown.active, shell.attack_cooldown.start_time)
+
+    def activate_shells(self) -> None:
+        center = self.player.hitbox.center
+        near = {zone.shell for zone in self.shell_zones.query(pygame.Rect(center, (1, 1))) if zone.rect.collidepoint(center)}
+        woken = [shell for shell in near if shell.asleep]
+        # shells out of reach stay awake until they have finished their attack
+        settled = [shell for shell in self.awake_shells - near if shell.settled]
+        for shell in woken:
+            shell.wake(self.steps)
+            self.awake_shells.add(shell)
+        for shell in settled:
+            shell.sleep(self.steps)
+            self.awake_shells.discard(shell)
+        if woken or settled:
+            self.all_sprites.update_order = None
+
+    def chunk_range(self, rect) -> tuple[range, range]:
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        cols = range(int(rect.left // chunk_pixels), int((rect.right - 1) // chunk_pixels) + 1)
+        rows = range(int(rect.top // chunk_pixels), int((rect.bottom - 1) // chunk_pixels) + 1)
+        return cols, rows
+
+    def stream(self) -> None:
+        if self.stream_margin is None:
+            for chunk in sorted(self.chunk_entries.keys() - self.live_chunks.keys()):
+                self.live_chunks[chunk] = [sprite for entry in self.chunk_entries[chunk] for sprite in self.spawn(entry)]
+            return
+        margin = self.stream_margin
+        view = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        view.center = self.player.rect.center
+        spawn_range = self.chunk_range(view.inflate(margin * 2, margin * 2))
+        if spawn_range == self.stream_range:
+            return
+        self.stream_range = spawn_range
+
+        # release far away chunks, a wider range than the spawn range so walking back and forth does not rebuild them
+        keep_cols, keep_rows = self.chunk_range(view.inflate(margin * 4, margin * 4))
+        for chunk in list(self.live_chunks):
+            if chunk[0] not in keep_cols or chunk[1] not in keep_rows:
+                self.despawn_chunk(chunk)
+
+        spawn_cols, spawn_rows = spawn_range
+        for col in spawn_cols:
+            for row in spawn_rows:
+                chunk = (col, row)
+                if chunk in self.chunk_entries and chunk not in self.live_chunks:
+                    self.live_chunks[chunk] = [sprite for entry in self.chunk_entries[chunk] for sprite in self.spawn(entry)]
+
+    def despawn_chunk(self, chunk) -> None:
+        for sprite in self.live_chunks.pop(chunk):
+            self.collision_grid.remove(sprite)
+            self.coin_grid.remove(sprite)
+            self.damage_grid.remove(sprite)
+            if sprite in self.trigger_zones:
+                self.remove_shell(sprite)
+            self.entry_orders.pop(sprite, None)
+            self.chunk_cache.discard(sprite)
+            sprite.kill()
+        for layer_name in ('terrain', 'water'):
+            self.chunks.pop((layer_name, *chunk), None)
     
+    def bake_tile(self, layer_name, pos, surf, z) -> StaticChunk | None:
+        # returns the chunk when the tile started a new one
+        chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        col, row = int(pos[0] // chunk_pixels), int(pos[1] // chunk_pixels)
+        key = (layer_name, col, row)
+        new_chunk = None
+        if key not in self.chunks:
+            rect = pygame.Rect(col * chunk_pixels, row * chunk_pixels, chunk_pixels, chunk_pixels)
+            self.chunks[key] = new_chunk = StaticChunk(rect, self.all_sprites, z, self.chunk_cache)
+        self.chunks[key].add_tile(surf, pos)
+        return new_chunk
+
     def create_pearl(self, pos, direction) -> None:
         Pearl(
             pos=pos,
             groups= [self.all_sprites, self.damage_sprites, self.pearl_sprites],
             surf= self.pearl_surf,
             direction= direction,
-            speed= 150 )
+            speed= 150,
+            clock= self.get_ticks)
         
-    def get_coins(self) -> None: 
-        collided_coins = pygame.sprite.spritecollide(sprite=self.player, group=self.coin_sprites, dokill=True)
-        sprite:Coin
-        for sprite in collided_coins:
-            Particle(pos=sprite.rect.center, frames= self.particle_surfs, groups=self.all_sprites)
-            if sprite.coin_type == 'gold':
-                # add coin value to player coin total
-                pass
+    def find_contacts(self) -> list[tuple[str, pygame.sprite.Sprite]]:
+        # every moving body only looks at the bodies in the cells around it
+        player = self.player
+        contacts = [('coin', coin) for coin in self.coin_grid.collide(player.rect)]
+        contacts += [('damage', sprite) for sprite in self.damage_grid.collide(player.hitbox)]
+        pearl_grid = SpatialHash(TILE_SIZE)
+        pearl_grid.add_sprites(self.pearl_sprites)
+        contacts += [('damage', pearl) for pearl in pearl_grid.collide(player.hitbox)]
+        for pearl in pearl_grid.order:
+            # the shell that fires a pearl is a collision sprite as well
+            if any(sprite not in self.shell_sprites for sprite in self.collision_grid.collide(pearl.rect)):
+                contacts.append(('pearl terrain', pearl))
+        return contacts
+
+    def resolve_contacts(self) -> None:
+        for kind, sprite in self.find_contacts():
+            self.contact_callbacks[kind](sprite)
+
+    def collect_coin(self, coin) -> None:
+        self.collected_coins.add(self.entry_orders.pop(coin))
+        self.coin_grid.remove(coin)
+        coin.kill()
+        Particle(pos=coin.rect.center, frames= self.particle_surfs, groups=self.all_sprites)
+        if coin.coin_type == 'gold':
+            # add coin value to player coin total
+            pass
+
+    def damage_player(self, sprite) -> None:
+        # health is not part of the game yet, a pearl that hits the player is used up
+        if sprite in self.pearl_sprites:
+            self.pop_pearl(sprite)
+
+    def pop_pearl(self, pearl) -> None:
+        pearl.has_collided = True
             
     def event_loop(self) -> None:      
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
+                self.save_replay()
                 pygame.quit()
                 sys.exit()
             if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
                 if not self.switch_timer.active:
+                    self.save_replay()
                     self.switch_timer.activate()
                     self.switch()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                profiler.toggle_overlay()
+
+    def save_replay(self) -> None:
+        if self.recorder:
+            self.recorder.save(REPLAY_FILE, state_checksum(self))
+            self.recorder = None
 
     def run(self, dt) -> None:
         # update
-        self.event_loop()
+        with profiler.phase('events'):
+            self.event_loop()
         self.switch_timer.update()
-        self.all_sprites.update(dt)
-        self.get_coins()
-        # draw
+        self.keys = self.input_source() if self.input_source else pygame.key.get_pressed()
+        if self.recorder:
+            self.recorder.record(dt, self.keys)
+        self.stream()
+        # fixed steps keep the physics the same on every machine
+        self.accumulator += dt
+        with profiler.phase('update'):
+            while self.accumulator >= SIMULATION_STEP:
+                self.step(SIMULATION_STEP)
+                self.accumulator -= SIMULATION_STEP
+        for shell in self.shell_sprites:
+            if shell.asleep:
+                shell.show_idle(self.steps)
+        # draw, in between the last two steps
         self.display_surface.fill(SKY_COLOR)
-        self.all_sprites.custom_draw(self.player)
+        with profiler.phase('custom_draw'):
+            self.all_sprites.custom_draw(self.player, self.accumulator / SIMULATION_STEP)
+
+    def step(self, dt) -> None:
+        self.activate_shells()
+        self.ticks += dt * 1000
+        self.all_sprites.store_positions()
+        for clock in self.animation_clocks.values():
+            clock.update(dt)
+        self.all_sprites.update(dt)
+        self.resolve_contacts()
+        self.steps += 1
+
+class TriggerZone:
+    def __init__(self, shell, rect) -> None:
+        self.shell = shell
+        self.rect = rect
+
+class ChunkCache:
+    def __init__(self, size) -> None:
+        self.size = size
+        self.chunks: OrderedDict[StaticChunk, None] = OrderedDict()
+
+    def touch(self, chunk) -> None:
+        self.chunks[chunk] = None
+        self.chunks.move_to_end(chunk)
+        # drop the surfaces of the chunks that have not been drawn for the longest time
+        while len(self.chunks) > self.size:
+            oldest, _ = self.chunks.popitem(last = False)
+            oldest.surface = None
+
+    def discard(self, chunk) -> None:
+        self.chunks.pop(chunk, None)
 
 class CameraGroup(pygame.sprite.Group):
     def __init__(self) -> None:
         super().__init__()
         self.display_surface =  pygame.display.get_surface()
         self.offset = vector()
+        # draw order is the order the sprites were added in
+        self.draw_order: dict[pygame.sprite.Sprite, int] = {}
+        self.counter = count()
+        # set while a sprite from the grid is built, so it keeps its place in the draw order
+        self.spawn_key = None
+        self.update_order = None
+        # culling
+        self.view_rect = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT)
+        self.static_index = SpatialHash(TILE_SIZE * 4)
+        self.moving_sprites: dict[pygame.sprite.Sprite, None] = {}
+        self.pending_sprites: dict[pygame.sprite.Sprite, None] = {}
+        # interpolation
+        self.previous_positions: dict[pygame.sprite.Sprite, tuple[float, float]] = {}
+
+    def add_internal(self, sprite, layer = None) -> None:
+        super().add_internal(sprite, layer)
+        self.draw_order[sprite] = next(self.counter) if self.spawn_key is None else self.spawn_key
+        self.update_order = None
+        # sprites set their rect and z after joining the group, index them on the next draw
+        self.pending_sprites[sprite] = None
+
+    def remove_internal(self, sprite) -> None:
+        super().remove_internal(sprite)
+        del self.draw_order[sprite]
+        self.update_order = None
+        if sprite in self.pending_sprites:
+            del self.pending_sprites[sprite]
+        elif sprite in self.moving_sprites:
+            del self.moving_sprites[sprite]
+        else:
+            self.static_index.remove(sprite)
+        self.previous_positions.pop(sprite, None)
+
+    def index_pending(self) -> None:
+        for sprite in self.pending_sprites:
+            if sprite.z not in LEVEL_LAYERS.values():
+                continue
+            if sprite.moving:
+                self.moving_sprites[sprite] = None
+            else:
+                self.static_index.add(sprite)
+        self.pending_sprites.clear()
+
+    def update(self, *args, **kwargs) -> None:
+        # in draw order as well, so shells see the player the same way no matter when either was built
+        if self.update_order is None:
+            self.update_order = sorted((sprite for sprite in self.draw_order if sprite.needs_update), key = self.draw_order.__getitem__)
+        for sprite in self.update_order:
+            sprite.update(*args, **kwargs)
+
+    def store_positions(self) -> None:
+        self.index_pending()
+        self.previous_positions = {sprite: sprite.rect.topleft for sprite in self.moving_sprites}
+
+    def draw_position(self, sprite, alpha) -> tuple[float, float]:
+        x, y = sprite.rect.topleft
+        if sprite not in self.previous_positions:
+            return x, y
+        previous_x, previous_y = self.previous_positions[sprite]
+        return previous_x + (x - previous_x) * alpha, previous_y + (y - previous_y) * alpha
+
+    def visible_sprites(self) -> list[pygame.sprite.Sprite]:
+        self.index_pending()
+        self.view_rect.topleft = self.offset
+        visible = self.static_index.collide(self.view_rect)
+        visible.extend(sprite for sprite in self.moving_sprites if sprite.rect.colliderect(self.view_rect))
+        visible.sort(key = self.draw_order.__getitem__)
+        return visible
 
-    def custom_draw(self, player = None) -> None:
-        self.offset.x = player.rect.centerx - WINDOW_WIDTH / 2
-        self.offset.y = player.rect.centery - WINDOW_HEIGHT /2
-        for sprite in self:
-            for layer in LEVEL_LAYERS.values():
-                if sprite.z == layer:
-                    offset_rect = sprite.rect.copy()
-                    offset_rect.center -= self.offset
-                    self.display_surface.blit(sprite.image, offset_rect)
\ No newline at end of file
+    def custom_draw(self, player = None, alpha = 1.0) -> None:
+        player_x, player_y = self.draw_position(player, alpha)
+        self.offset.x = player_x + player.rect.width / 2 - WINDOW_WIDTH / 2
+        self.offset.y = player_y + player.rect.height / 2 - WINDOW_HEIGHT /2
+        offset_x, offset_y = self.offset
+        # one blits call for every run of sprites that share a layer
+        batch = []
+        batch_z = None
+        visible_sprites = self.visible_sprites()
+        for sprite in visible_sprites:
+            if sprite.z != batch_z and batch:
+                self.display_surface.blits(batch, doreturn = False)
+                profiler.count('blits calls')
+                batch = []
+            batch_z = sprite.z
+            if sprite.moving:
+                x, y = self.draw_position(sprite, alpha)
+            else:
+                x, y = sprite.rect.topleft
+            batch.append((sprite.image, (x - offset_x, y - offset_y)))
+        if batch:
+            self.display_surface.blits(batch, doreturn = False)
+            profiler.count('blits calls')
+        profiler.count('sprites', len(self))
+        profiler.count('blits', len(visible_sprites))
@@ -0,0 +1,134 @@
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Mapping
+
+# file layout (little endian)
+# header: magic, version, layer count
+# layer:  name length, name, value count, values, tile count, positions (x, y int32 pairs), value index per tile (uint16)
+# value:  kind (0 int, 1 str) followed by an int32 or a length prefixed utf-8 string
+MAGIC = b'PMLV'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+COUNT = struct.Struct('<I')
+LENGTH = struct.Struct('<B')
+VALUE_COUNT = struct.Struct('<H')
+INT_VALUE = struct.Struct('<i')
+
+
+class PackedLayer(Mapping):
+    def __init__(self, positions: array, ids: array, values: tuple) -> None:
+        self.positions = positions
+        self.ids = ids
+        self.values = values
+        # only built when a single position is looked up
+        self.index = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self):
+        positions = self.positions
+        for i in range(len(self.ids)):
+            yield positions[i * 2], positions[i * 2 + 1]
+
+    def __getitem__(self, pos):
+        if self.index is None:
+            self.index = {key: i for i, key in enumerate(self)}
+        return self.values[self.ids[self.index[pos]]]
+
+    def items(self):
+        positions, ids, values = self.positions, self.ids, self.values
+        for i in range(len(ids)):
+            yield (positions[i * 2], positions[i * 2 + 1]), values[ids[i]]
+
+
+def pack_layer(name, layer) -> bytes:
+    values = list(dict.fromkeys(layer.values()))
+    value_index = {value: i for i, value in enumerate(values)}
+    positions = array('i')
+    ids = array('H')
+    for (x, y), value in layer.items():
+        if x != int(x) or y != int(y):
+            raise ValueError(f'{name}: position {(x, y)} is not on a whole pixel')
+        positions.extend((int(x), int(y)))
+        ids.append(value_index[value])
+    if sys.byteorder == 'big':
+        positions.byteswap()
+        ids.byteswap()
+
+    encoded_name = name.encode()
+    data = [LENGTH.pack(len(encoded_name)), encoded_name, VALUE_COUNT.pack(len(values))]
+    for value in values:
+        if isinstance(value, str):
+            encoded_value = value.encode()
+            data += [LENGTH.pack(1), LENGTH.pack(len(encoded_value)), encoded_value]
+        else:
+            data += [LENGTH.pack(0), INT_VALUE.pack(value)]
+    data += [COUNT.pack(len(ids)), positions.tobytes(), ids.tobytes()]
+    return b''.join(data)
+
+
+def dumps(grid) -> bytes:
+    return HEADER.pack(MAGIC, VERSION, len(grid)) + b''.join(pack_layer(name, layer) for name, layer in grid.items())
+
+
+def loads(data) -> dict[str, PackedLayer]:
+    data = memoryview(data)
+    magic, version, layer_count = HEADER.unpack_from(data, 0)
+    if magic != MAGIC:
+        raise ValueError('not a level file')
+    if version != VERSION:
+        raise ValueError(f'unsupported level file version {version}')
+    offset = HEADER.size
+
+    grid = {}
+    for _ in range(layer_count):
+        length, = LENGTH.unpack_from(data, offset)
+        offset += LENGTH.size
+        name = bytes(data[offset:offset + length]).decode()
+        offset += length
+
+        value_count, = VALUE_COUNT.unpack_from(data, offset)
+        offset += VALUE_COUNT.size
+        values = []
+        for _ in range(value_count):
+            kind, = LENGTH.unpack_from(data, offset)
+            offset += LENGTH.size
+            if kind:
+                length, = LENGTH.unpack_from(data, offset)
+                offset += LENGTH.size
+                values.append(bytes(data[offset:offset + length]).decode())
+                offset += length
+            else:
+                values.append(INT_VALUE.unpack_from(data, offset)[0])
+                offset += INT_VALUE.size
+
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        # bulk copies, no per tile objects until the layer is read
+        positions = array('i')
+        positions.frombytes(data[offset:offset + count * 2 * positions.itemsize])
+        offset += count * 2 * positions.itemsize
+        ids = array('H')
+        ids.frombytes(data[offset:offset + count * ids.itemsize])
+        offset += count * ids.itemsize
+        if sys.byteorder == 'big':
+            positions.byteswap()
+            ids.byteswap()
+        grid[name] = PackedLayer(positions, ids, tuple(values))
+    return grid
+
+
+def save_level(path, grid) -> None:
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok = True)
+    with open(path, 'wb') as file:
+        file.write(dumps(grid))
+
+
+def load_level(path) -> dict[str, PackedLayer]:
+    with open(path, 'rb') as file:
+        return loads(file.read())
@@ -1,9 +1,11 @@
+import atexit
 import os
 
-from pygame.image import load
+from assets import assets
 from pygame.math import Vector2 as vector
 from editor import Editor
 from level import Level
+from profiler import profiler
 from settings import *
 from support import *
 
@@ -16,6 +18,12 @@ class Main:
         pygame.init()
         self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         self.clock = pygame.time.Clock()
+        if PROFILER:
+            profiler.enable()
+            atexit.register(profiler.dump_trace)
+        assets.open_bundle(ASSET_BUNDLE)
+        self.loading_step = None
+        assets.preload(image_paths('../graphics'), progress = self.loading_screen)
         self.imports()
 
         self.editor_active = True
@@ -23,14 +31,36 @@ class Main:
         self.editor = Editor(self.land_tiles, self.switch)
 
         # cursor
-        surf = load("../graphics/cursors/mouse.png").convert_alpha()
+        surf = assets.image("../graphics/cursors/mouse.png")
         cursor = pygame.cursors.Cursor((0, 0), surf)
-        pygame.mouse.set_cursor(cursor)
+        try:
+            pygame.mouse.set_cursor(cursor)
+        except pygame.error:
+            # the dummy video driver of the headless benchmarks has no cursors
+            pass
+        # everything is loaded, a warm start can skip decoding next time
+        assets.save_bundle()
+
+    def loading_screen(self, done, total) -> None:
+        pygame.event.pump()
+        # redrawing for every image would cost more than the decoding
+        step = 20 * done // max(total, 1)
+        if step == self.loading_step:
+            return
+        self.loading_step = step
+        self.display_surface.fill(SKY_COLOR)
+        bar_rect = pygame.Rect(0, 0, WINDOW_WIDTH / 2, 20)
+        bar_rect.center = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
+        progress_rect = bar_rect.copy()
+        progress_rect.width = bar_rect.width * done / max(total, 1)
+        pygame.draw.rect(self.display_surface, BUTTON_BG_COLOR, progress_rect)
+        pygame.draw.rect(self.display_surface, BUTTON_BG_COLOR, bar_rect, 2)
+        pygame.display.update()
 
     def imports(self) -> None:
         # terrain
         self.land_tiles = import_folder_dict('../graphics/terrain/land')
-        self.water_bottom = load('../graphics/terrain/water/water_bottom.png').convert_alpha()
+        self.water_bottom = assets.image('../graphics/terrain/water/water_bottom.png')
         self.water_top_animation = import_folder('../graphics/terrain/water/animation')
         # coins
         self.gold = import_folder('../graphics/items/gold')
@@ -40,51 +70,78 @@ class Main:
         # palm trees
         self.palms = import_subfolder_dict('../graphics/terrain/palm')
         # enemies
-        self.spikes = load('../graphics/enemies/spikes/spikes.png').convert_alpha()
+        self.spikes = assets.image('../graphics/enemies/spikes/spikes.png')
         self.tooth = import_subfolder_dict('../graphics/enemies/tooth')
         self.shell = import_subfolder_dict('../graphics/enemies/shell_left')
-        self.pearl = load('../graphics/enemies/pearl/pearl.png').convert_alpha()
+        self.pearl = assets.image('../graphics/enemies/pearl/pearl.png')
         # player
         self.player_graphics = import_subfolder_dict('../graphics/player')
 
         
 
+    def wait_for_input(self) -> list[pygame.event.Event]:
+        # sleep until something happens, the clouds and animations still move at a low rate
+        # the event that woke us up is handed on, posting it again would put it behind newer ones
+        event = pygame.event.wait(1000 // IDLE_FPS)
+        return [] if event.type == pygame.NOEVENT else [event]
+
     def toggle(self) -> None:
         self.editor_active = not self.editor_active
 
+    def level_assets(self) -> dict:
+        return {
+            'land': self.land_tiles,
+            'water bottom': self.water_bottom,
+            'water top': self.water_top_animation,
+            'gold': self.gold,
+            'silver': self.silver,
+            'diamond': self.diamond,
+            'particle': self.particle,
+            'palms': self.palms,
+            'spikes': self.spikes,
+            'tooth': self.tooth,
+            'shell': self.shell,
+            'pearl': self.pearl,
+            'player': self.player_graphics
+
+            }
+
     def switch(self, grid = None) -> None:
         if not self.transition.active:
             self.transition.active = True
             if grid:
-                self.level = Level(grid, self.switch, {
-                    'land': self.land_tiles,
-                    'water bottom': self.water_bottom,
-                    'water top': self.water_top_animation,
-                    'gold': self.gold,
-                    'silver': self.silver,
-                    'diamond': self.diamond,
-                    'particle': self.particle,
-                    'palms': self.palms,
-                    'spikes': self.spikes,
-                    'tooth': self.tooth,
-                    'shell': self.shell,
-                    'pearl': self.pearl,
-                    'player': self.player_graphics
-
-                    })
+                self.level = Level(grid, self.switch, self.level_assets())
 
     def run(self):
         while True:
-            dt = self.clock.tick() / 1000
+            profiler.begin_frame()
+            pending = []
+            if self.editor_active and not self.transition.active and self.editor.idle():
+                pending = self.wait_for_input()
+            dt = self.clock.tick(FPS) / 1000
             # limit the size of dt to prevent issues when moving the window
             max_dt = 0.1
             dt = min(dt, max_dt)
             if self.editor_active: 
-                self.editor.run(dt)
+                # the transition covers the whole screen
+                if self.transition.active:
+                    self.editor.redraw_all = True
+                self.editor.run(dt, pending)
             else:
                 self.level.run(dt)
-            self.transition.display(dt)
-            pygame.display.update()
+            with profiler.phase('transition'):
+                self.transition.display(dt)
+            overlay_rect = profiler.draw_overlay(self.display_surface)
+            with profiler.phase('display_update'):
+                if self.editor_active and self.editor.dirty_rects_enabled and not self.transition.active:
+                    if overlay_rect:
+                        # the overlay has to be painted over on the next frame
+                        self.editor.mark_dirty(overlay_rect)
+                        self.editor.dirty_rects.append(overlay_rect)
+                    pygame.display.update(self.editor.dirty_rects)
+                else:
+                    pygame.display.update()
+            profiler.end_frame()
 
 class Transition:
     def __init__(self, toggle) -> None:
@@ -1,6 +1,7 @@
-from pygame.image import load
+from assets import assets
 
 from settings import *
+from tiles import TILES
 
 
 class Menu:
@@ -16,14 +17,10 @@ class Menu:
 
     def create_data(self):
         self.menu_surfs = {}
-        for key, value in EDITOR_DATA.items():
-            if value["menu"]:
-                if not value["menu"] in self.menu_surfs:
-                    self.menu_surfs[value["menu"]] = [(key, load(value["menu_surf"]))]
-                else:
-                    self.menu_surfs[value["menu"]].append(
-                        (key, load(value["menu_surf"]))
-                    )
+        for menu, ids in TILES.by_menu.items():
+            self.menu_surfs[menu] = [
+                (key, assets.image(EDITOR_DATA[key]["menu_surf"], convert=False)) for key in ids
+            ]
 
     def create_buttons(self):
         # menu area
@@ -71,13 +68,14 @@ class Menu:
 
     def highlight_indicator(self, index):
         highlighted_btn = None
-        if EDITOR_DATA[index]["menu"] == "terrain":
+        menu = TILES.menus[index]
+        if menu == "terrain":
             highlighted_btn = self.tile_btn_rect
-        if EDITOR_DATA[index]["menu"] == "coin":
+        if menu == "coin":
             highlighted_btn = self.coin_btn_rect
-        if EDITOR_DATA[index]["menu"] == "enemy":
+        if menu == "enemy":
             highlighted_btn = self.enemy_btn_rect
-        if EDITOR_DATA[index]["menu"] in ("palm bg", "palm fg"):
+        if menu in ("palm bg", "palm fg"):
             highlighted_btn = self.palm_btn_rect
         pygame.draw.rect(
             self.display_surface, BUTTON_LINE_COLOR, highlighted_btn.inflate(4, 4), 5, 4
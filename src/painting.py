@@ -0,0 +1,51 @@
+from typing import NamedTuple
+
+
+class FrameInput(NamedTuple):
+    # the mouse as it is for the whole frame, buttons clicked and released within the frame count as held
+    pos: tuple[int, int]
+    buttons: tuple[bool, bool, bool]
+
+
+def cell_line(start, end) -> list[tuple[int, int]]:
+    # cells on the line from start to end, both included, like a line of pixels
+    col, row = start
+    end_col, end_row = end
+    step_col = 1 if end_col > col else -1
+    step_row = 1 if end_row > row else -1
+    width = abs(end_col - col)
+    height = -abs(end_row - row)
+    error = width + height
+    cells = [(col, row)]
+    while (col, row) != (end_col, end_row):
+        double = error * 2
+        if double >= height:
+            error += height
+            col += step_col
+        if double <= width:
+            error += width
+            row += step_row
+        cells.append((col, row))
+    return cells
+
+
+class Stroke:
+    # one drag with a painting button, the mouse is sampled once a frame and the cells in between are filled in
+    __slots__ = ('tile_id', 'erase', 'last_cell', 'cells')
+
+    def __init__(self, tile_id, erase) -> None:
+        self.tile_id = tile_id
+        self.erase = erase
+        self.last_cell = None
+        # every cell painted so far, a cell is only painted once per stroke
+        self.cells: set[tuple[int, int]] = set()
+
+    def extend(self, cell) -> list[tuple[int, int]]:
+        # the new cells up to this one
+        if cell == self.last_cell:
+            return []
+        segment = cell_line(self.last_cell, cell) if self.last_cell is not None else [cell]
+        self.last_cell = cell
+        new_cells = [cell for cell in segment if cell not in self.cells]
+        self.cells.update(new_cells)
+        return new_cells
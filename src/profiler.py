@@ -0,0 +1,152 @@
+import json
+from array import array
+from contextlib import nullcontext
+from time import perf_counter_ns
+
+import pygame
+
+from settings import *
+
+NULL_PHASE = nullcontext()
+
+
+class Phase:
+    def __init__(self, profiler, name) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self) -> None:
+        self.start = perf_counter_ns()
+
+    def __exit__(self, *exc) -> None:
+        self.profiler.record(self.name, self.start, perf_counter_ns())
+
+
+class FrameProfiler:
+    def __init__(self, frames = 240, events = 4096) -> None:
+        self.enabled = False
+        self.overlay = False
+        self.phases: dict[str, Phase] = {}
+        # ring buffers
+        self.frame_times = array('d', [0.0] * frames)
+        self.frame_count = 0
+        self.event_names = [''] * events
+        self.event_starts = array('q', [0] * events)
+        self.event_durations = array('q', [0] * events)
+        self.event_count = 0
+        self.frame_start = 0
+        # per frame counters, like sprites and blits
+        self.counters: dict[str, int] = {}
+        self.shown_counters: dict[str, int] = {}
+        # overlay
+        self.font = None
+        self.overlay_lines = []
+        self.overlay_rect = pygame.Rect(0, 0, 0, 0)
+
+    def enable(self) -> None:
+        self.enabled = True
+
+    def toggle_overlay(self) -> None:
+        self.overlay = not self.overlay
+        # the overlay needs numbers
+        if self.overlay:
+            self.enabled = True
+
+    # recording
+    def phase(self, name):
+        if not self.enabled:
+            return NULL_PHASE
+        if name not in self.phases:
+            self.phases[name] = Phase(self, name)
+        return self.phases[name]
+
+    def record(self, name, start, end) -> None:
+        index = self.event_count % len(self.event_names)
+        self.event_names[index] = name
+        self.event_starts[index] = start
+        self.event_durations[index] = end - start
+        self.event_count += 1
+
+    def count(self, name, amount = 1) -> None:
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def begin_frame(self) -> None:
+        if self.enabled:
+            self.frame_start = perf_counter_ns()
+            self.counters = {}
+
+    def end_frame(self) -> None:
+        if self.enabled and self.frame_start:
+            end = perf_counter_ns()
+            self.record('frame', self.frame_start, end)
+            self.frame_times[self.frame_count % len(self.frame_times)] = (end - self.frame_start) / 1_000_000
+            self.frame_count += 1
+            self.shown_counters = self.counters
+
+    # stats
+    def events(self) -> list[tuple[str, int, int]]:
+        size = len(self.event_names)
+        first = max(0, self.event_count - size)
+        return [(self.event_names[i % size], self.event_starts[i % size], self.event_durations[i % size])
+                for i in range(first, self.event_count)]
+
+    def frame_percentiles(self) -> dict[str, float]:
+        times = sorted(self.frame_times[:min(self.frame_count, len(self.frame_times))])
+        if not times:
+            return {}
+        return {name: times[min(len(times) - 1, int(len(times) * fraction))]
+                for name, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99))}
+
+    def phase_averages(self) -> dict[str, float]:
+        totals = {}
+        frames = 0
+        for name, start, duration in self.events():
+            if name == 'frame':
+                frames += 1
+            else:
+                totals[name] = totals.get(name, 0) + duration
+        return {name: total / max(frames, 1) / 1_000_000 for name, total in totals.items()}
+
+    # output
+    def draw_overlay(self, surface) -> pygame.Rect | None:
+        if not self.overlay:
+            return None
+        if not self.font:
+            self.font = pygame.font.Font(None, 22)
+        # the text only changes a few times per second
+        if self.frame_count % 15 == 0 or not self.overlay_lines:
+            percentiles = self.frame_percentiles()
+            lines = ['frame ' + '  '.join(f'{name} {value:.2f}' for name, value in percentiles.items()) + ' ms']
+            lines += [f'{name} {value:.2f} ms' for name, value in sorted(self.phase_averages().items())]
+            lines += [f'{name} {value}' for name, value in self.shown_counters.items()]
+            self.overlay_lines = [self.font.render(line, True, BUTTON_LINE_COLOR) for line in lines]
+            width = max(line.get_width() for line in self.overlay_lines) + 20
+            height = sum(line.get_height() for line in self.overlay_lines) + 20
+            self.overlay_rect = pygame.Rect(10, 10, width, height)
+        pygame.draw.rect(surface, BUTTON_BG_COLOR, self.overlay_rect, 0, 4)
+        y = self.overlay_rect.top + 10
+        for line in self.overlay_lines:
+            surface.blit(line, (self.overlay_rect.left + 10, y))
+            y += line.get_height()
+        return self.overlay_rect
+
+    def dump_trace(self, path = PROFILER_TRACE) -> None:
+        if not self.event_count:
+            return
+        events = self.events()
+        origin = min(start for name, start, duration in events)
+        trace = [{
+            'name': name,
+            'ph': 'X',
+            'ts': (start - origin) / 1000,
+            'dur': duration / 1000,
+            'pid': 1,
+            'tid': 1,
+        } for name, start, duration in events]
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
+
+
+profiler = FrameProfiler()
@@ -0,0 +1,43 @@
+from collections import deque
+from typing import Callable
+
+
+def region_bounds(start, end) -> tuple[range, range]:
+    # the cols and rows between two corner cells, both included
+    cols = range(min(start[0], end[0]), max(start[0], end[0]) + 1)
+    rows = range(min(start[1], end[1]), max(start[1], end[1]) + 1)
+    return cols, rows
+
+
+def rect_cells(start, end) -> list[tuple[int, int]]:
+    cols, rows = region_bounds(start, end)
+    return [(col, row) for row in rows for col in cols]
+
+
+def flood_cells(start, matches: Callable[[tuple[int, int]], bool], cols: range, rows: range, limit) -> list[tuple[int, int]]:
+    # cells connected to start by their sides that match, it never leaves the bounds or finds more than limit cells
+    if start[0] not in cols or start[1] not in rows or not matches(start):
+        return []
+    found = {start}
+    queue = deque([start])
+    while queue and len(found) < limit:
+        col, row = queue.popleft()
+        for cell in ((col + 1, row), (col - 1, row), (col, row + 1), (col, row - 1)):
+            if cell not in found and cell[0] in cols and cell[1] in rows and matches(cell):
+                found.add(cell)
+                queue.append(cell)
+    return list(found)
+
+
+class Clipboard:
+    # a copied region, cells and objects relative to its top left cell
+    __slots__ = ('cells', 'objects')
+
+    def __init__(self, cells: dict[tuple[int, int], int], objects: list[tuple[int, tuple[float, float]]]) -> None:
+        # offset -> packed tile state, empty cells are left out so pasting does not clear anything
+        self.cells = cells
+        # (tile id, pixel offset of the top left)
+        self.objects = objects
+
+    def __bool__(self) -> bool:
+        return bool(self.cells or self.objects)
@@ -0,0 +1,110 @@
+import hashlib
+import os
+import struct
+import sys
+from array import array
+
+import pygame
+
+import level_file
+
+# file layout (little endian)
+# header: magic, version, frame count, level size, checksum of the state after the last frame
+# body:   level file, dt per frame (float64), pressed keys per frame (one bit per key in KEYS)
+MAGIC = b'PMRP'
+VERSION = 1
+HEADER = struct.Struct('<4sHII16s')
+KEYS = (pygame.K_LEFT, pygame.K_RIGHT, pygame.K_SPACE)
+KEY_BITS = {key: 1 << i for i, key in enumerate(KEYS)}
+
+
+class KeyState:
+    def __init__(self, mask) -> None:
+        self.mask = mask
+
+    def __getitem__(self, key) -> bool:
+        return bool(self.mask & KEY_BITS.get(key, 0))
+
+
+def key_mask(keys) -> int:
+    return sum(bit for key, bit in KEY_BITS.items() if keys[key])
+
+
+def state_checksum(level) -> bytes:
+    # only what the game play depends on, so changes to the drawing keep the checksum
+    player = level.player
+    state = [
+        level.ticks,
+        tuple(player.pos), tuple(player.direction), tuple(player.hitbox),
+        player.on_floor, player.state, player.orientation,
+        sorted(level.collected_coins),
+        sorted(tuple(pearl.rect) for pearl in level.pearl_sprites),
+        sorted((tuple(shell.rect), shell.state, int(shell.idle_index(level.steps) if shell.asleep else shell.frame_index),
+                shell.has_shot, shell.attack_cooldown.active)
+               for shell in level.shell_sprites),
+    ]
+    return hashlib.md5(repr(state).encode()).digest()
+
+
+class Recorder:
+    def __init__(self, grid) -> None:
+        self.level_data = level_file.dumps(grid)
+        self.dts = array('d')
+        self.masks = array('B')
+
+    def record(self, dt, keys) -> None:
+        self.dts.append(dt)
+        self.masks.append(key_mask(keys))
+
+    def save(self, path, checksum) -> None:
+        dts = array('d', self.dts)
+        if sys.byteorder == 'big':
+            dts.byteswap()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok = True)
+        with open(path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(self.masks), len(self.level_data), checksum))
+            file.write(self.level_data)
+            file.write(dts.tobytes())
+            file.write(self.masks.tobytes())
+
+
+class Replay:
+    def __init__(self, grid, dts: array, masks: array, checksum) -> None:
+        self.grid = grid
+        self.dts = dts
+        self.masks = masks
+        self.checksum = checksum
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    def keys(self):
+        # called once per frame by the level, in place of pygame.key.get_pressed
+        return map(KeyState, self.masks).__next__
+
+    @classmethod
+    def loads(cls, data) -> 'Replay':
+        data = memoryview(data)
+        magic, version, frame_count, level_size, checksum = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError('not a replay file')
+        if version != VERSION:
+            raise ValueError(f'unsupported replay file version {version}')
+        offset = HEADER.size
+        grid = level_file.loads(data[offset:offset + level_size])
+        offset += level_size
+        dts = array('d')
+        dts.frombytes(data[offset:offset + frame_count * dts.itemsize])
+        offset += frame_count * dts.itemsize
+        masks = array('B')
+        masks.frombytes(data[offset:offset + frame_count])
+        if sys.byteorder == 'big':
+            dts.byteswap()
+        return cls(grid, dts, masks, checksum)
+
+    @classmethod
+    def load(cls, path) -> 'Replay':
+        with open(path, 'rb') as file:
+            return cls.loads(file.read())
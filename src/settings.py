@@ -4,11 +4,32 @@ import pygame
 TILE_SIZE = 64
 WINDOW_WIDTH = 1280
 WINDOW_HEIGHT = 720
+FPS = 60  # frame cap, 0 runs uncapped
+SIMULATION_STEP = 1 / 120  # the level physics always advance in steps of this many seconds
+IDLE_FPS = 10  # editor redraw rate while nobody touches it
+IDLE_DELAY = 2000  # ms without input before the editor idles
 ANIMATION_SPEED = 8
+CHUNK_SIZE = 8  # tiles per side of a chunk
+CHUNK_CACHE_SIZE = 48  # baked chunk surfaces kept in memory
+SHELL_WAKE_MARGIN = TILE_SIZE  # shells wake up this far before the player is in their range, more than a step can move
+STREAM_MARGIN = CHUNK_SIZE * TILE_SIZE  # level sprites are built this far around the view and released twice as far
+LEVEL_FILE = '../levels/level.pml'
+ASSET_BUNDLE = '../cache/assets.bundle'  # pre-decoded images for a fast start
+TRANSFORM_CACHE_SIZE = 256  # flipped, scaled and faded surfaces kept for reuse
+EDITOR_DIRTY_RECTS = False  # only redraw and update the changed parts of the editor screen
+PROFILER = False  # time every frame phase from the start, F3 shows the overlay either way
+PROFILER_TRACE = '../profile_trace.json'  # Chrome trace written on exit when PROFILER is on
+RECORD_REPLAYS = False  # record the input of every level run, replay it with python -m bench.replay
+REPLAY_FILE = '../replays/last.pmr'
+UNDO_STEPS = 200  # editor undo steps kept
+UNDO_CELLS = 1_000_000  # cell changes kept over all undo steps, the oldest steps are dropped first
+UNDO_COALESCE = 400  # ms, strokes of the same kind closer together than this are undone as one
+FLOOD_FILL_LIMIT = 100_000  # cells a single flood fill can reach
 
 # editor graphics
 EDITOR_DATA = {
     0: {
+        "name": "player",
         "style": "player",
         "type": "object",
         "menu": None,
@@ -17,6 +38,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/player/idle_right",
     },
     1: {
+        "name": "sky",
         "style": "sky",
         "type": "object",
         "menu": None,
@@ -25,6 +47,7 @@ EDITOR_DATA = {
         "graphics": None,
     },
     2: {
+        "name": "land",
         "style": "terrain",
         "type": "tile",
         "menu": "terrain",
@@ -33,6 +56,7 @@ EDITOR_DATA = {
         "graphics": None,
     },
     3: {
+        "name": "water",
         "style": "water",
         "type": "tile",
         "menu": "terrain",
@@ -41,6 +65,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/water/animation",
     },
     4: {
+        "name": "gold",
         "style": "coin",
         "type": "tile",
         "menu": "coin",
@@ -49,6 +74,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/items/gold",
     },
     5: {
+        "name": "silver",
         "style": "coin",
         "type": "tile",
         "menu": "coin",
@@ -57,6 +83,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/items/silver",
     },
     6: {
+        "name": "diamond",
         "style": "coin",
         "type": "tile",
         "menu": "coin",
@@ -65,6 +92,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/items/diamond",
     },
     7: {
+        "name": "spikes",
         "style": "enemy",
         "type": "tile",
         "menu": "enemy",
@@ -73,6 +101,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/enemies/spikes",
     },
     8: {
+        "name": "tooth",
         "style": "enemy",
         "type": "tile",
         "menu": "enemy",
@@ -81,6 +110,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/enemies/tooth/idle",
     },
     9: {
+        "name": "shell_left",
         "style": "enemy",
         "type": "tile",
         "menu": "enemy",
@@ -89,6 +119,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/enemies/shell_left/idle",
     },
     10: {
+        "name": "shell_right",
         "style": "enemy",
         "type": "tile",
         "menu": "enemy",
@@ -97,6 +128,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/enemies/shell_right/idle",
     },
     11: {
+        "name": "small_fg",
         "style": "palm_fg",
         "type": "object",
         "menu": "palm fg",
@@ -105,6 +137,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/small_fg",
     },
     12: {
+        "name": "large_fg",
         "style": "palm_fg",
         "type": "object",
         "menu": "palm fg",
@@ -113,6 +146,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/large_fg",
     },
     13: {
+        "name": "left_fg",
         "style": "palm_fg",
         "type": "object",
         "menu": "palm fg",
@@ -121,6 +155,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/left_fg",
     },
     14: {
+        "name": "right_fg",
         "style": "palm_fg",
         "type": "object",
         "menu": "palm fg",
@@ -129,6 +164,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/right_fg",
     },
     15: {
+        "name": "small_bg",
         "style": "palm_bg",
         "type": "object",
         "menu": "palm bg",
@@ -137,6 +173,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/small_bg",
     },
     16: {
+        "name": "large_bg",
         "style": "palm_bg",
         "type": "object",
         "menu": "palm bg",
@@ -145,6 +182,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/large_bg",
     },
     17: {
+        "name": "left_bg",
         "style": "palm_bg",
         "type": "object",
         "menu": "palm bg",
@@ -153,6 +191,7 @@ EDITOR_DATA = {
         "graphics": "../graphics/terrain/palm/left_bg",
     },
     18: {
+        "name": "right_bg",
         "style": "palm_bg",
         "type": "object",
         "menu": "palm bg",
@@ -0,0 +1,64 @@
+import pygame
+from itertools import count
+
+from settings import TILE_SIZE
+
+
+class SpatialHash:
+    def __init__(self, cell_size = TILE_SIZE) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple[int, int], list[pygame.sprite.Sprite]] = {}
+        # insertion order, so queries return sprites in the same order as a group scan
+        self.order: dict[pygame.sprite.Sprite, int] = {}
+        self.counter = count()
+
+    def cell_range(self, rect) -> tuple[range, range]:
+        size = self.cell_size
+        cols = range(int(rect.left // size), int((rect.right - 1) // size) + 1)
+        rows = range(int(rect.top // size), int((rect.bottom - 1) // size) + 1)
+        return cols, rows
+
+    def add(self, sprite, order = None) -> None:
+        if sprite in self.order:
+            return
+        self.order[sprite] = next(self.counter) if order is None else order
+        cols, rows = self.cell_range(sprite.rect)
+        for col in cols:
+            for row in rows:
+                self.cells.setdefault((col, row), []).append(sprite)
+
+    def add_sprites(self, sprites) -> None:
+        for sprite in sprites:
+            self.add(sprite)
+
+    def remove(self, sprite) -> None:
+        if sprite not in self.order:
+            return
+        del self.order[sprite]
+        cols, rows = self.cell_range(sprite.rect)
+        for col in cols:
+            for row in rows:
+                cell = self.cells.get((col, row))
+                if cell:
+                    cell.remove(sprite)
+                    if not cell:
+                        del self.cells[(col, row)]
+
+    def query(self, rect) -> list[pygame.sprite.Sprite]:
+        cols, rows = self.cell_range(rect)
+        found = set()
+        for col in cols:
+            for row in rows:
+                cell = self.cells.get((col, row))
+                if cell:
+                    found.update(cell)
+        return sorted(found, key = self.order.__getitem__)
+
+    def collide(self, rect) -> list[pygame.sprite.Sprite]:
+        return [sprite for sprite in self.query(rect) if sprite.rect.colliderect(rect)]
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def __contains__(self, sprite) -> bool:
+        return sprite in self.order
@@ -1,24 +1,89 @@
 from pygame.math import Vector2 as vector
 
+from assets import transforms
 from settings import *
 from settings import LEVEL_LAYERS
+from spatial import SpatialHash
 from support import *
 from timer import Timer
 from typing import Callable
 
 class GenericSprite(pygame.sprite.Sprite):
+    moving = False
+    # the level only calls update on the sprites that do something in it
+    needs_update = False
+
     def __init__(self, pos, surf, groups, z = LEVEL_LAYERS['main']) -> None:
         super().__init__(groups)
         self.image = surf
         self.rect = self.image.get_rect(topleft= pos)
         self.z = z
 
+class StaticChunk(pygame.sprite.Sprite):
+    moving = False
+    needs_update = False
+
+    def __init__(self, rect, groups, z, cache) -> None:
+        super().__init__(groups)
+        self.rect = rect
+        self.z = z
+        self.tiles = []
+        # the surface is baked on first draw and may be dropped again by the cache
+        self.surface = None
+        self.cache = cache
+
+    def add_tile(self, surf, pos) -> None:
+        self.tiles.append((surf, (pos[0] - self.rect.x, pos[1] - self.rect.y), None, pygame.BLEND_RGBA_ADD))
+        self.surface = None
+
+    def bake(self) -> None:
+        # tiles never overlap, so adding them onto a clear surface copies their pixels and alpha as is
+        self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        self.surface.blits(self.tiles, doreturn = False)
+
+    @property
+    def image(self) -> pygame.Surface:
+        if self.surface is None:
+            self.bake()
+        self.cache.touch(self)
+        return self.surface
+
 class Block(GenericSprite):
     def __init__(self, pos, size, groups) -> None:
         surf = pygame.Surface(size)
         super().__init__(pos, surf, groups)
 
+class AnimationClock:
+    def __init__(self, frames) -> None:
+        self.frames = frames
+        self.frame_index = 0
+        self.animation_speed = ANIMATION_SPEED
+
+    def update(self, dt) -> None:
+        self.frame_index += self.animation_speed * dt
+        self.frame_index = 0 if self.frame_index >= len(self.frames) else self.frame_index
+
+    @property
+    def image(self) -> pygame.Surface:
+        return self.frames[int(self.frame_index)]
+
+class ClockedSprite(GenericSprite):
+    # animated by a clock that all sprites with the same frames share
+    def __init__(self, pos, clock, groups, z = LEVEL_LAYERS['main']) -> None:
+        self.clock = clock
+        super().__init__(pos, clock.frames[0], groups, z)
+
+    @property
+    def image(self) -> pygame.Surface:
+        return self.clock.image
+
+    @image.setter
+    def image(self, surf) -> None:
+        pass
+
 class AnimatedSprite(GenericSprite):
+    needs_update = True
+
     def __init__(self, pos, frames, groups, z = LEVEL_LAYERS['main']) -> None:
         self.frames = frames
         self.frame_index = 0
@@ -33,9 +98,9 @@ class AnimatedSprite(GenericSprite):
     def update(self, dt) -> None:
         self.animate(dt)
         
-class Coin(AnimatedSprite):
-    def __init__(self, pos, frames, groups, coin_type) -> None:
-        super().__init__(pos, frames, groups)
+class Coin(ClockedSprite):
+    def __init__(self, pos, clock, groups, coin_type) -> None:
+        super().__init__(pos, clock, groups)
         self.rect = self.image.get_rect(center=pos)
         self.coin_type = coin_type
 
@@ -65,7 +130,13 @@ class Tooth(GenericSprite):
         self.rect.bottom = self.rect.top + TILE_SIZE
 
 class Shell(GenericSprite):
-    def __init__(self, orientation, pos, frames, groups, create_pearl, damage_sprites) -> None:
+    # how close the player has to be for an attack
+    attack_range = 500
+    attack_height = 30
+    # frame index after every step of an idle loop that starts at 0, by frame count
+    idle_loops: dict[int, list[float]] = {}
+
+    def __init__(self, orientation, pos, frames, groups, create_pearl, damage_sprites, clock = None) -> None:
         self.frame_index = 0
         self.orientation = orientation
         self.pearl_direction = -1 # default left
@@ -80,8 +151,12 @@ class Shell(GenericSprite):
         # attack
         self.create_pearl: Callable[[], None] =  create_pearl
         self.has_shot = False
-        self.attack_cooldown = Timer(2000)
+        self.attack_cooldown = Timer(2000, clock = clock)
         self.damage_sprites = damage_sprites
+        # sleep
+        self.needs_update = True
+        self.sleep_step = 0
+        self.loop_rest = []
     
     def animate(self, dt) -> None:
         current_frames = self.frames[self.state]
@@ -100,8 +175,8 @@ class Shell(GenericSprite):
     def get_state(self) -> None:
         shell_pos = vector(self.rect.center)
         player_pos = vector(self.player.hitbox.center)
-        player_level = abs(shell_pos.y - player_pos.y) < 30
-        player_near = shell_pos.distance_to(player_pos) < 500
+        player_level = abs(shell_pos.y - player_pos.y) < self.attack_height
+        player_near = shell_pos.distance_to(player_pos) < self.attack_range
         player_front = shell_pos.x < player_pos.x if self.pearl_direction > 0 \
             else shell_pos.x  > player_pos.x
         if player_near and player_front and player_level and not self.attack_cooldown.active :
@@ -109,9 +184,57 @@ class Shell(GenericSprite):
         else:
             self.state = 'idle'
 
+    def trigger_zone(self, margin) -> pygame.Rect:
+        zone = pygame.Rect(0, 0, (self.attack_range + margin) * 2, (self.attack_height + margin) * 2)
+        zone.center = self.rect.center
+        return zone
+
+    @property
+    def asleep(self) -> bool:
+        return not self.needs_update
+
+    @property
+    def settled(self) -> bool:
+        return self.state == 'idle' and not self.has_shot
+
+    def sleep(self, step_count) -> None:
+        # a settled shell that cannot see the player only plays its idle loop, which can be worked out later
+        self.needs_update = False
+        self.sleep_step = step_count
+        frame_count = len(self.frames['idle'])
+        self.loop_rest = []
+        frame_index = self.frame_index + ANIMATION_SPEED * SIMULATION_STEP
+        while frame_index < frame_count:
+            self.loop_rest.append(frame_index)
+            frame_index += ANIMATION_SPEED * SIMULATION_STEP
+        if frame_count not in self.idle_loops:
+            loop = [0]
+            while loop[-1] + ANIMATION_SPEED * SIMULATION_STEP < frame_count:
+                loop.append(loop[-1] + ANIMATION_SPEED * SIMULATION_STEP)
+            self.idle_loops[frame_count] = loop
+
+    def idle_index(self, step_count) -> float:
+        steps = step_count - self.sleep_step
+        if steps == 0:
+            return self.frame_index
+        if steps <= len(self.loop_rest):
+            return self.loop_rest[steps - 1]
+        loop = self.idle_loops[len(self.frames['idle'])]
+        return loop[(steps - len(self.loop_rest) - 1) % len(loop)]
+
+    def show_idle(self, step_count) -> None:
+        self.image = self.frames['idle'][int(self.idle_index(step_count))]
+
+    def wake(self, step_count) -> None:
+        self.frame_index = self.idle_index(step_count)
+        self.image = self.frames['idle'][int(self.frame_index)]
+        # the timer runs on the level time, one update catches up on all the skipped ones
+        self.attack_cooldown.update()
+        self.needs_update = True
+
     def flip_frames(self) -> None:
         for key, surfs in self.frames.items():
-            self.frames[key] = [pygame.transform.flip(surf, True, False) for surf in surfs]
+            self.frames[key] = [transforms.flip(surf, True, False) for surf in surfs]
 
     def update(self, dt) -> None:
         self.get_state()
@@ -119,7 +242,10 @@ class Shell(GenericSprite):
         self.attack_cooldown.update()
 
 class Pearl(GenericSprite):
-    def __init__(self, pos, direction, surf, groups, speed) -> None:
+    moving = True
+    needs_update = True
+
+    def __init__(self, pos, direction, surf, groups, speed, clock = None) -> None:
         super().__init__(pos, surf, groups)
         self.image = surf
         self.direction = direction
@@ -127,7 +253,7 @@ class Pearl(GenericSprite):
         self.rect = self.image.get_frect(center= pos + self.pearl_offset)
         self.speed = speed
         # self destruct
-        self.lifetime_timer = Timer(6000)
+        self.lifetime_timer = Timer(6000, clock = clock)
         self.lifetime_timer.activate()
         self.has_collided = False
 
@@ -141,7 +267,10 @@ class Pearl(GenericSprite):
             
 
 class Player(GenericSprite):
-    def __init__(self, pos, assets, groups, collision_sprites) -> None:
+    moving = True
+    needs_update = True
+
+    def __init__(self, pos, assets, groups, collision_grid, get_keys = None) -> None:
         # animation
         self.animation_speed = ANIMATION_SPEED
         self.frames = assets
@@ -158,9 +287,12 @@ class Player(GenericSprite):
         self.on_floor = False
 
         # collision
-        self.collision_sprites:list[pygame.sprite.Sprite] = collision_sprites
+        self.collision_grid: SpatialHash = collision_grid
         self.hitbox = self.rect.inflate(-50,0)
 
+        # input, the level hands in recorded keys when it replays a run
+        self.get_keys = get_keys or pygame.key.get_pressed
+
     def get_state(self) -> None:
         if self.direction.y < 0 :
             self.state = 'jump'
@@ -176,7 +308,7 @@ class Player(GenericSprite):
         self.image = current_animation[int(self.frame_index)]
     
     def input(self) -> None:
-        keys = pygame.key.get_pressed()
+        keys = self.get_keys()
         if keys[pygame.K_RIGHT]: 
             self.direction.x = 1
             self.orientation = 'right'
@@ -207,12 +339,17 @@ class Player(GenericSprite):
 
     def check_on_floor(self) -> None:
         self.floor_rect = pygame.Rect(self.hitbox.left,self.hitbox.bottom,self.hitbox.width,2)
-        floor_sprites = [sprite for sprite in self.collision_sprites if sprite.rect.colliderect(self.floor_rect)]
+        floor_sprites = self.collision_grid.collide(self.floor_rect)
         self.on_floor = True if floor_sprites else False
 
     def collision(self, direction) -> None:
         # sprite:pygame.sprite.Sprite
-        for sprite in self.collision_sprites:
+        area = self.hitbox.copy()
+        candidates = self.collision_grid.query(area)
+        index = 0
+        while index < len(candidates):
+            sprite = candidates[index]
+            index += 1
             if sprite.rect.colliderect(self.hitbox):
                 if direction == 'horizontal':
                     # moving right
@@ -226,6 +363,14 @@ class Player(GenericSprite):
                     self.hitbox.bottom = sprite.rect.top if self.direction.y > 0 else self.hitbox.bottom
                     self.rect.centery, self.pos.y = self.hitbox.centery, self.hitbox.centery
                     self.direction.y = 0
+
+                # the hitbox got pushed out of the queried cells, pick up the sprites there as well
+                if not area.contains(self.hitbox):
+                    area.union_ip(self.hitbox)
+                    order = self.collision_grid.order
+                    current = order[sprite]
+                    candidates = [other for other in self.collision_grid.query(area) if order[other] > current]
+                    index = 0
                 
     def update(self,dt) -> None:
         self.input()
@@ -1,33 +1,65 @@
-import pygame
-from os import walk
+from os import scandir, walk
 from os.path import join
 
+from assets import assets
+
+
+class Frames(list):
+    def __init__(self, surfaces) -> None:
+        super().__init__(surfaces)
+        # metadata, so nobody has to measure the frames every frame
+        self.count = len(self)
+        self.size = (
+            max((surf.get_width() for surf in self), default=0),
+            max((surf.get_height() for surf in self), default=0),
+        )
+
+
+# one entry per folder, shared by every caller
+frame_cache: dict[str, Frames] = {}
+
+
+def frame_order(name) -> tuple:
+    # numbered frames by their number, everything else by name after them
+    stem = name.split(".")[0]
+    return (0, int(stem), name) if stem.isdigit() else (1, 0, name)
+
+
+def list_images(path) -> list:
+    with scandir(path) as entries:
+        return sorted((entry.name for entry in entries if entry.is_file()), key=frame_order)
+
+
+def list_folders(path) -> list:
+    with scandir(path) as entries:
+        return sorted(entry.name for entry in entries if entry.is_dir())
+
+
+def image_paths(path) -> list:
+    return [join(folder_name, image_name) for folder_name, sub_folders, img_files in walk(path) for image_name in img_files]
+
+
+def import_frames(path) -> Frames:
+    if path not in frame_cache:
+        frame_cache[path] = Frames(assets.image(join(path, image_name)) for image_name in list_images(path))
+    return frame_cache[path]
+
 
 def import_folder(path) -> list:
-    surface_list = []
-    for folder_name, sub_folders, img_files in walk(path):
-        for image_name in img_files:
-            full_path = path + "/" + image_name
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            # add image_surf to the surface list
-            surface_list.append(image_surf)
-    return surface_list
+    return import_frames(path)
 
 
 def import_folder_dict(path) -> dict:
     surface_dict = {}
-    for folder_name, sub_folders, img_files in walk(path):
-        for image_name in img_files:
-            full_path = path + "/" + image_name     
-            image_surf = pygame.image.load(full_path).convert_alpha()
-            # add image_surf to the surface dict
-            surface_dict[image_name.split(".")[0]] = image_surf
+    for image_name in list_images(path):
+        image_surf = assets.image(join(path, image_name))
+        # add image_surf to the surface dict
+        surface_dict[image_name.split(".")[0]] = image_surf
     return surface_dict
 
 
 def import_subfolder_dict(path)-> dict[dict]:
     surface_dict = {
-        folder: import_folder(f'{path}/{folder}') for folder in list(walk(path))[0][1]
+        folder: import_folder(join(path, folder)) for folder in list_folders(path)
         }
     return surface_dict
-
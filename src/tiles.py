@@ -0,0 +1,51 @@
+from types import MappingProxyType
+from typing import NamedTuple
+
+from settings import EDITOR_DATA
+
+
+class TileRegistry(NamedTuple):
+    # EDITOR_DATA compiled once, every lookup is an index into a tuple or a set test
+    styles: tuple[str | None, ...]
+    # 'gold' or 'shell_left', the level picks its assets by it
+    names: tuple[str | None, ...]
+    menus: tuple[str | None, ...]
+    by_menu: MappingProxyType
+    tile_ids: frozenset[int]
+    menu_ids: tuple[int, ...]
+    # objects every level has, they can be moved but not deleted
+    fixed_ids: frozenset[int]
+    palm_ids: frozenset[int]
+    palm_bg_ids: frozenset[int]
+    player_id: int
+    sky_id: int
+
+
+def tile_registry(data) -> TileRegistry:
+    size = max(data) + 1
+    styles, names, menus = [None] * size, [None] * size, [None] * size
+    by_style: dict[str, list[int]] = {}
+    by_menu: dict[str, list[int]] = {}
+    for key, value in data.items():
+        styles[key] = value['style']
+        names[key] = value['name']
+        menus[key] = value['menu']
+        by_style.setdefault(value['style'], []).append(key)
+        if value['menu']:
+            by_menu.setdefault(value['menu'], []).append(key)
+    player_id, sky_id = by_style['player'][0], by_style['sky'][0]
+    return TileRegistry(
+        styles = tuple(styles),
+        names = tuple(names),
+        menus = tuple(menus),
+        by_menu = MappingProxyType({menu: tuple(ids) for menu, ids in by_menu.items()}),
+        tile_ids = frozenset(key for key, value in data.items() if value['type'] == 'tile'),
+        menu_ids = tuple(key for key in data if menus[key]),
+        fixed_ids = frozenset((player_id, sky_id)),
+        palm_ids = frozenset(by_style.get('palm_fg', []) + by_style.get('palm_bg', [])),
+        palm_bg_ids = frozenset(by_style.get('palm_bg', [])),
+        player_id = player_id,
+        sky_id = sky_id)
+
+
+TILES = tile_registry(EDITOR_DATA)
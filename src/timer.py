@@ -1,15 +1,17 @@
 import pygame
 
 class Timer:
-    def __init__(self, duration, func = None) -> None:
+    def __init__(self, duration, func = None, clock = None) -> None:
         self.duration = duration
         self.active = False
         self.start_time = 0
         self.func = func
+        # anything that returns milliseconds, the level passes its simulation time
+        self.clock = clock or pygame.time.get_ticks
 
     def activate(self) -> None:
         self.active = True
-        self.start_time = pygame.time.get_ticks()
+        self.start_time = self.clock()
 
     def deactivate(self) -> None:
         self.active = False
@@ -17,7 +19,7 @@ class Timer:
 
 
     def update(self) -> None:
-        current_time = pygame.time.get_ticks()
+        current_time = self.clock()
         if current_time - self.start_time >= self.duration:
             if self.func and self.start_time:
                 self.func()